@@ -0,0 +1,97 @@
+"""Compare the vectorized dashboard cleaning with the former clean_data of the app.
+
+Run from the repository root:  python -m scripts.benchmark_clean [n_listings]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.dashboard_aggregates import clean_listings
+from src.data_pipeline.snapshot_store import load_snapshot
+
+
+# Reference implementation, as clean_data was in src/app/app.py
+def clean_data(df):
+    # Remove rows where distance is NaN (they most likely are on an island)
+    df.dropna(subset=['distance'], inplace=True)
+
+    # Remove rows where price is NaN 
+    df.dropna(subset=['original_price'], inplace=True)
+
+    # Remove rows where orginal_price or price is 0
+    no_price = ((df['original_price'] < 1000) | (df['price'] < 1000))
+    df = df[~no_price]
+
+    # Remove rows missing the surface and number of rooms
+    no_rooms_and_surface = ((df['rooms'].isna()) & (df['surface'].isna()))
+    df = df[~no_rooms_and_surface]
+
+    # Remove rows where the surface is over 250 m2
+    big_surface = ((df['surface'] >= 250))
+    df = df[~big_surface]
+
+    def impute_rooms(row):
+        if pd.isna(row['rooms']):
+            # Find the number of rooms with the closest average surface to the row's surface
+            closest_rooms = (average_surface_by_rooms - row['surface']).abs().idxmin()
+            return closest_rooms
+        return row['rooms']
+
+    average_surface_by_rooms = df.groupby('rooms')['surface'].mean()
+    df['rooms'] = df.apply(impute_rooms, axis=1)
+
+    # Remove outliers
+    lower_bound = df['price'].quantile(0.05)
+    upper_bound = df['price'].quantile(0.95)
+
+    filtered_df = df[(df['price'] >= lower_bound) & (df['price'] <= upper_bound)]
+    return filtered_df
+
+
+def stored_listings() -> pd.DataFrame:
+    """One row per URL, as in cabins_main."""
+    listings = load_snapshot('all').drop_duplicates('url', keep='last').reset_index(drop=True)
+    listings['rooms'] = listings['rooms'].astype(float)
+    return listings
+
+def assert_identical(expected: pd.DataFrame, actual: pd.DataFrame):
+    pd.testing.assert_index_equal(expected.index, actual.index)
+    for column in expected.columns:
+        left, right = expected[column], actual[column]
+        if column == 'rooms':
+            left, right = left.astype(float), right.astype(float)
+        pd.testing.assert_series_equal(left, right)
+
+def timed(function, df: pd.DataFrame) -> tuple:
+    start = time.perf_counter()
+    result = function(df)
+    return result, time.perf_counter() - start
+
+def main(n_listings: int = 1_000_000):
+    listings = stored_listings()
+    assert_identical(clean_data(listings.copy()), clean_listings(listings))
+    print(f"Identical results on {len(listings)} stored listings")
+
+    # Resample the stored listings with more missing room counts and jittered surfaces, so ties and gaps vary
+    rng = np.random.default_rng(0)
+    synthetic = listings.iloc[rng.integers(0, len(listings), n_listings)].reset_index(drop=True)
+    synthetic.loc[rng.random(n_listings) < 0.1, 'rooms'] = np.nan
+    synthetic['surface'] = synthetic['surface'] + rng.integers(-5, 6, n_listings)
+
+    # The row-wise reference runs on a sample; the vectorized version on every size
+    sample = synthetic.iloc[:100_000]
+    expected, rowwise_time = timed(clean_data, sample.copy())
+    actual, vectorized_time = timed(clean_listings, sample)
+    assert_identical(expected, actual)
+    print(f"{len(sample)} synthetic listings")
+    print(f"  row-wise apply: {rowwise_time:.3f}s")
+    print(f"  vectorized:     {vectorized_time:.3f}s ({rowwise_time / vectorized_time:.1f}x faster)")
+
+    for size in (100_000, 300_000, n_listings):
+        _, vectorized_time = timed(clean_listings, synthetic.iloc[:size])
+        print(f"  vectorized, {size} listings: {vectorized_time:.3f}s")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
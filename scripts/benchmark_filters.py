@@ -0,0 +1,77 @@
+"""Compare dashboard filtering through the bitmap index with pandas boolean masks.
+
+Run from the repository root:  python -m scripts.benchmark_filters [n_listings]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.app.filter_index import RANGE_COLUMNS, VALUE_COLUMNS, BitmapIndex
+from src.data_pipeline.dashboard_aggregates import clean_listings
+from src.data_pipeline.healthcare_features import HEALTHCARE_COLUMNS, healthcare_features
+from src.data_pipeline.regions import assign_regions
+from src.data_pipeline.snapshot_store import load_snapshot
+
+
+# Reference implementation: one boolean mask per filter over the whole frame
+def filter_masks(df: pd.DataFrame, index: BitmapIndex, active: tuple) -> pd.DataFrame:
+    keep = pd.Series(True, index=df.index)
+    for column, selected in active:
+        if column in index.stops:
+            stops = index.stops[column]
+            low, high = selected
+            keep &= (df[column] <= stops[high]) & ((df[column] > stops[low]) if low > 0 else df[column].notna())
+        else:
+            keep &= df[column].isin(selected)
+    return df[keep]
+
+def random_filters(index: BitmapIndex, rng: np.random.Generator) -> dict:
+    filters = {}
+    for column in RANGE_COLUMNS:
+        stops = index.stops[column]
+        filters[column] = tuple(np.sort(stops[rng.integers(0, len(stops), 2)]))
+    for column in VALUE_COLUMNS:
+        values = index.values[column]
+        filters[column] = [value for value in values if rng.random() < 0.7]
+    return filters
+
+def main(n_listings: int = 1_000_000, n_queries: int = 200):
+    listings = clean_listings(load_snapshot('all').drop_duplicates('url'))
+    listings['winterized'] = listings['winterized'] == 'YES'
+    listings['region'] = assign_regions(listings)
+    listings[HEALTHCARE_COLUMNS] = healthcare_features(listings)
+    rng = np.random.default_rng(0)
+    df = listings.iloc[rng.integers(0, len(listings), n_listings)].reset_index(drop=True)
+    # Jitter the numeric columns so that few values repeat
+    for column in RANGE_COLUMNS:
+        df[column] = df[column] * rng.normal(1, 0.05, n_listings)
+
+    start = time.perf_counter()
+    index = BitmapIndex(df)
+    build_time = time.perf_counter() - start
+
+    queries = [index.active(random_filters(index, rng)) for _ in range(n_queries)]
+    select_times, rows_times, mask_times = [], [], []
+    for active in queries:
+        start = time.perf_counter()
+        selection = index.select(active)
+        select_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        selected = index.rows(selection)
+        rows_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        expected = filter_masks(df, index, active)
+        mask_times.append(time.perf_counter() - start)
+        assert index.count(selection) == len(expected) and selected.index.equals(expected.index)
+
+    print(f"{n_listings} listings, {n_queries} random filter combinations, identical selections")
+    print(f"  index build:      {build_time:.2f}s")
+    print(f"  pandas masks:     {np.median(mask_times) * 1000:.2f}ms median")
+    print(f"  bitmap select:    {np.median(select_times) * 1000:.3f}ms median, {np.percentile(select_times, 95) * 1000:.3f}ms p95"
+          f" ({np.median(mask_times) / np.median(select_times):.0f}x faster)")
+    print(f"  selected rows:    {np.median(rows_times) * 1000:.2f}ms median")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,53 @@
+"""Measure geocoding throughput offline against the mock provider server.
+
+Compares the former row-by-row lookups (a new connection per call) with
+GeocodingEngine. Provider rate limits are lifted so the numbers reflect the
+engine itself; real runs are bounded by PROVIDER_RATES.
+
+Run from the repository root:  python -m scripts.benchmark_geocoding [n_addresses]
+"""
+import sys
+import time
+
+import requests
+
+from src.data_pipeline.geocoding import GeocodingEngine
+from scripts.mock_api_server import start_mock_server, mock_provider_urls
+
+
+def sequential_lookups(addresses: list, urls: dict) -> list:
+    """Nominatim, then Google, one fresh connection per request, as transform_data used to do."""
+    results = []
+    for address in addresses:
+        response = requests.get(urls["nominatim"], params={"q": address, "format": "json"}).json()
+        if response:
+            results.append((float(response[0]["lat"]), float(response[0]["lon"])))
+            continue
+        location = requests.get(urls["google"], params={"address": address}).json()["results"][0]["geometry"]["location"]
+        results.append((location["lat"], location["lng"]))
+    return results
+
+def main(n_addresses: int = 400):
+    server, base_url = start_mock_server(latency=0.05)
+    urls = mock_provider_urls(base_url)
+    # Every tenth address misses in Nominatim, and a quarter of the rows repeat an address
+    addresses = [f"Mökkitie {i % (n_addresses * 3 // 4)}{' nomatch' if i % 10 == 0 else ''}, Kunta" for i in range(n_addresses)]
+
+    start = time.perf_counter()
+    expected = sequential_lookups(addresses, urls)
+    sequential_time = time.perf_counter() - start
+
+    engine = GeocodingEngine("key", "key", urls=urls, rates={provider: 10_000 for provider in urls}, max_workers=16)
+    start = time.perf_counter()
+    coords = engine.geocode_many(addresses)
+    engine_time = time.perf_counter() - start
+    engine.close()
+    server.shutdown()
+
+    assert [coords[address] for address in addresses] == expected
+    print(f"{n_addresses} addresses, 50ms simulated provider latency")
+    print(f"  sequential: {sequential_time:.2f}s ({n_addresses / sequential_time:.1f} addresses/s)")
+    print(f"  engine:     {engine_time:.2f}s ({n_addresses / engine_time:.1f} addresses/s), provider calls: {engine.calls}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 400)
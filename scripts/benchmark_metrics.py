@@ -0,0 +1,71 @@
+"""Compare the vectorized metrics parser with the former row-wise apply.
+
+Run from the repository root:  python -m scripts.benchmark_metrics [n_listings]
+"""
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.cabins_transform import parse_metrics
+from src.data_pipeline.feeds import find_snapshots, read_snapshot
+
+
+# Row-wise reference implementation, as it was before parse_metrics
+def find_price(metrics: list) -> float:
+    price = next((i.replace('€', '').replace('\xa0', '').replace(',', '.').strip() for i in metrics if '€' in i), pd.NA)
+    return float(price) if not pd.isna(price) else price
+
+def find_surface(metrics: list) -> float:
+    surface = next((i.split(' ')[0].replace('\xa0', '').replace(',', '.').strip() for i in metrics if 'm²' in i), pd.NA)
+    return float(surface) if not pd.isna(surface) else surface
+
+def find_year(metrics: list) -> int:
+    years = [int(i) for i in metrics if re.search(r'\d{4}', i)]
+    return years[0] if len(years) == 1 else pd.NA
+
+def parse_metrics_rowwise(metrics: pd.Series) -> pd.DataFrame:
+    return pd.DataFrame({
+        "price": metrics.apply(find_price),
+        "surface": metrics.apply(find_surface),
+        "year": metrics.apply(find_year),
+    })
+
+
+def assert_identical(expected: pd.DataFrame, actual: pd.DataFrame):
+    """Both parsers must agree value by value, missing values included."""
+    for column in expected.columns:
+        left = pd.to_numeric(expected[column].astype(object).where(expected[column].notna()), errors='raise')
+        right = pd.to_numeric(actual[column].astype(object).where(actual[column].notna()), errors='raise')
+        pd.testing.assert_series_equal(left.astype(float), right.astype(float), check_names=False)
+
+def stored_metrics() -> pd.Series:
+    """Every metrics list of every stored snapshot."""
+    records = [listing['metrics'] for timestamp in find_snapshots() for listing in read_snapshot(timestamp)[0]]
+    return pd.Series(records)
+
+def timed(function, metrics: pd.Series) -> tuple:
+    start = time.perf_counter()
+    result = function(metrics)
+    return result, time.perf_counter() - start
+
+def main(n_listings: int = 100_000):
+    metrics = stored_metrics()
+    assert_identical(parse_metrics_rowwise(metrics), parse_metrics(metrics))
+    print(f"Identical results on {len(metrics)} stored listings")
+
+    rng = np.random.default_rng(0)
+    synthetic = metrics.iloc[rng.integers(0, len(metrics), n_listings)].reset_index(drop=True)
+
+    expected, rowwise_time = timed(parse_metrics_rowwise, synthetic)
+    actual, vectorized_time = timed(parse_metrics, synthetic)
+    assert_identical(expected, actual)
+
+    print(f"{n_listings} synthetic listings")
+    print(f"  row-wise apply: {rowwise_time:.3f}s")
+    print(f"  vectorized:     {vectorized_time:.3f}s ({rowwise_time / vectorized_time:.1f}x faster)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,71 @@
+"""Compare the band-indexed region assignment with ray casting over every edge of every region.
+
+Run from the repository root:  python -m scripts.benchmark_regions [n_points]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.regions import REGIONS_PATH, Regions
+from src.data_pipeline.snapshot_store import load_snapshot
+
+
+# Reference implementation: bounding-box prefilter, then every edge of the region's rings
+def points_in_rings(x: np.ndarray, y: np.ndarray, rings: list) -> np.ndarray:
+    inside = np.zeros(len(x), dtype=bool)
+    for ring in rings:
+        x1, y1 = ring[:-1, 0][:, None], ring[:-1, 1][:, None]
+        x2, y2 = ring[1:, 0][:, None], ring[1:, 1][:, None]
+        crosses = (y1 > y) != (y2 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= (np.count_nonzero(crosses & (x < x_cross), axis=0) % 2).astype(bool)
+    return inside
+
+def assign_bruteforce(regions: Regions, latitude: np.ndarray, longitude: np.ndarray) -> pd.Series:
+    assigned = np.full(len(latitude), None, dtype=object)
+    for feature in regions.geojson['features']:
+        rings = [np.asarray(ring) for polygon in feature['geometry']['coordinates'] for ring in polygon]
+        lon_min, lat_min = min(ring[:, 0].min() for ring in rings), min(ring[:, 1].min() for ring in rings)
+        lon_max, lat_max = max(ring[:, 0].max() for ring in rings), max(ring[:, 1].max() for ring in rings)
+        candidates = np.flatnonzero(pd.isna(assigned) & (longitude >= lon_min) & (longitude <= lon_max) &
+                                    (latitude >= lat_min) & (latitude <= lat_max))
+        for start in range(0, len(candidates), 2000):
+            chunk = candidates[start:start + 2000]
+            assigned[chunk[points_in_rings(longitude[chunk], latitude[chunk], rings)]] = feature['id']
+    return pd.Series(assigned, name='region')
+
+
+def main(n_points: int = 100_000):
+    listings = load_snapshot('all').drop_duplicates('url').dropna(subset=['latitude', 'longitude'])
+    rng = np.random.default_rng(0)
+    sample = listings.iloc[rng.integers(0, len(listings), n_points)]
+    # Jitter the stored listings so that few coordinates repeat
+    latitude = np.round(sample['latitude'].to_numpy() + rng.normal(0, 0.01, n_points), 4)
+    longitude = np.round(sample['longitude'].to_numpy() + rng.normal(0, 0.02, n_points), 4)
+
+    regions = Regions.load(REGIONS_PATH)
+    start = time.perf_counter()
+    indexed = regions.assign(latitude, longitude)
+    indexed_time = time.perf_counter() - start
+    start = time.perf_counter()
+    regions.assign(latitude, longitude)
+    cached_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = assign_bruteforce(regions, latitude, longitude)
+    bruteforce_time = time.perf_counter() - start
+
+    # Points outside every polygon are placed by the coast tolerance in the indexed version only
+    inside = expected.notna()
+    assert (indexed[inside] == expected[inside]).all()
+    print(f"{n_points} jittered listing coordinates, identical regions for the {inside.sum()} inside a polygon;"
+          f" {indexed[~inside].notna().sum()} of the {(~inside).sum()} others placed by the coast tolerance")
+    print(f"  every edge:     {bruteforce_time:.3f}s")
+    print(f"  band index:     {indexed_time:.3f}s ({bruteforce_time / indexed_time:.1f}x faster)")
+    print(f"  cached repeat:  {cached_time:.3f}s")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
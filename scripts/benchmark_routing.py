@@ -0,0 +1,54 @@
+"""Compare per-listing Distance Matrix calls with batched requests, offline.
+
+Routes every located listing of the latest stored snapshot against the mock
+Distance Matrix server, as in a full refresh.
+
+Run from the repository root:  python -m scripts.benchmark_routing
+"""
+import os
+import time
+from glob import glob
+
+import pandas as pd
+import requests
+
+from src.data_pipeline.routing import get_distances_and_times, request_distances, format_destination
+from src.data_pipeline.feeds import snapshot_timestamp
+from scripts.mock_api_server import start_mock_server, mock_distance_matrix_url
+
+ORIGIN = 'place_id:ChIJsaJij2X4jUYRlrMoLAHZ8Ps'
+
+
+def per_listing_routes(df: pd.DataFrame, url: str) -> list:
+    """One request and one fresh connection per listing, as transform_data used to do."""
+    routes = []
+    for lat, lon in zip(df['latitude'], df['longitude']):
+        result = request_distances([format_destination(lat, lon)], "key", ORIGIN, requests, url)
+        routes.append(next(iter(result.values()), (None, None)))
+    return routes
+
+def main():
+    latest_csv = sorted(glob(os.path.join('data/cabins', 'etuovi_data_*.csv')), key=snapshot_timestamp)[-1]
+    df = pd.read_csv(latest_csv).dropna(subset=['latitude', 'longitude'])
+    df[['distance', 'duration']] = None
+
+    server, base_url = start_mock_server(latency=0.02)
+    url = mock_distance_matrix_url(base_url)
+
+    start = time.perf_counter()
+    expected = per_listing_routes(df, url)
+    per_listing_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    routes = get_distances_and_times(df, "key", ORIGIN, url=url)
+    batched_time = time.perf_counter() - start
+    server.shutdown()
+
+    assert [tuple(route) for route in routes.itertuples(index=False)] == expected
+    n_batched = -(-df[['latitude', 'longitude']].drop_duplicates().shape[0] // 25)
+    print(f"{len(df)} listings, 20ms simulated latency")
+    print(f"  per listing: {len(df)} requests, {per_listing_time:.2f}s")
+    print(f"  batched:     {n_batched} requests, {batched_time:.2f}s")
+
+if __name__ == "__main__":
+    main()
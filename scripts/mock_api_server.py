@@ -0,0 +1,109 @@
+"""Local stand-in for the Nominatim, Google and OpenRouteService geocoding APIs
+and the Google Distance Matrix API.
+
+Answers are deterministic fake coordinates in Finland derived from the address,
+with a configurable latency, so throughput can be measured offline. Addresses
+containing "nomatch" are unknown to Nominatim, exercising the fallback chain.
+Distance Matrix destinations north of latitude 69 get ZERO_RESULTS, exercising
+per-element failures.
+
+Run from the repository root:  python -m scripts.mock_api_server [port]
+"""
+import sys
+import json
+import time
+import zlib
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def fake_coordinates(address: str) -> tuple:
+    """Deterministic coordinates inside Finland's bounding box."""
+    seed = zlib.crc32(address.encode("utf-8"))
+    return 60.0 + (seed % 7000) / 1000, 21.0 + (seed // 7000 % 9000) / 1000
+
+
+def fake_route(destination: str) -> dict:
+    """A Distance Matrix element for a 'lat,lon' destination, in Google's text format."""
+    lat, lon = (float(value) for value in destination.split(","))
+    if lat > 69:
+        return {"status": "ZERO_RESULTS"}
+    # 1.3 x the straight line from HEL at 80 km/h
+    km = 1.3 * 111.2 * math.hypot(lat - 60.317, (lon - 24.963) * math.cos(math.radians(lat)))
+    minutes = round(km / 80 * 60)
+    hours, mins = divmod(minutes, 60)
+    duration = f"{hours} hour{'s' if hours != 1 else ''} {mins} mins" if hours else f"{mins} mins"
+    return {
+        "status": "OK",
+        "distance": {"text": f"{round(km)} km", "value": round(km * 1000)},
+        "duration": {"text": duration, "value": minutes * 60},
+    }
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    latency = 0.05
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path == "/search":
+            address = params.get("q", "")
+            lat, lon = fake_coordinates(address)
+            body = [] if "nomatch" in address else [{"lat": str(lat), "lon": str(lon)}]
+        elif url.path == "/maps/api/geocode/json":
+            lat, lon = fake_coordinates(params.get("address", ""))
+            body = {"status": "OK", "results": [{"geometry": {"location": {"lat": lat, "lng": lon}}}]}
+        elif url.path == "/maps/api/distancematrix/json":
+            destinations = params.get("destinations", "").split("|")
+            body = {"status": "OK", "rows": [{"elements": [fake_route(destination) for destination in destinations]}]}
+        elif url.path == "/geocode/search":
+            lat, lon = fake_coordinates(params.get("text", ""))
+            body = {"features": [{"geometry": {"coordinates": [lon, lat]}}]}
+        else:
+            self.send_error(404)
+            return
+        self.send_json(body)
+
+    def send_json(self, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(port: int = 0, latency: float = 0.05) -> tuple:
+    """Serve the mock APIs from a background thread; returns (server, base_url)."""
+    handler = type("ConfiguredMockApiHandler", (MockApiHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def mock_provider_urls(base_url: str) -> dict:
+    """Provider URLs for GeocodingEngine pointing at the mock server."""
+    return {
+        "nominatim": f"{base_url}/search",
+        "google": f"{base_url}/maps/api/geocode/json",
+        "openrouteservice": f"{base_url}/geocode/search",
+    }
+
+def mock_distance_matrix_url(base_url: str) -> str:
+    return f"{base_url}/maps/api/distancematrix/json"
+
+if __name__ == "__main__":
+    server, base_url = start_mock_server(int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
+    print(f"Mock APIs listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
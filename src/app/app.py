@@ -1,105 +1,51 @@
-import streamlit as st
-import streamlit.components.v1 as components
+import time
+SCRIPT_START = time.perf_counter()
 
 import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
-import numpy as np
-import pandas as pd
-import re
-
-
-#graph libraries
-
-import plotly.express as px 
-import plotly.io as pio
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-
-# import paramenters
-
-# Load environment variables from the .env file (if present)
-load_dotenv()
-
-# Access environment variables 
-POSTGRES_USER = os.getenv('PostgreSQL_USERNAME')
-POSTGRES_PSW = os.getenv('PostgreSQL_PSW')
-POSTGRES_SERVER = os.getenv('PostgreSQL_SERVER')
-POSTGRES_PORT = os.getenv('PostgreSQL_PORT')
-POSTGRES_DATABASE = os.getenv('PostgreSQL_DATABASE')
-
-#PALETTE = os.getenv('Streamlit_Palette')
-
-# Setting personalised graphs palette
-palette = ['#004d39', '#2a9d90', '#6abea6', '#b0c2a8', '#eee3dd']
-pio.templates["palette"] = go.layout.Template(
-    layout = {
-        'title':
-            {'font': {'color': '#000000'}
-            },
-        'font': {'color': '#000000', 'family': 'Roboto'},
-        'colorway': palette,
-    }
-)
-pio.templates.default = "palette"
-
-@st.cache_data
-def load_data():
-    # Import data from table
-    db_url = f"postgresql://{POSTGRES_USER}:{POSTGRES_PSW}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DATABASE}"
-
-    # Create a SQLAlchemy engine
-    engine = create_engine(db_url)
-
-    # Define the table name
-    table_name = "cabins_main"
-
-    # Fetch the data into a pandas DataFrame
-    df = pd.read_sql_table(table_name, engine)
-    return df
-
-@st.cache_data 
-def clean_data(df):
-    # Remove rows where distance is NaN (they most likely are on an island)
-    df.dropna(subset=['distance'], inplace=True)
-
-    # Remove rows where price is NaN 
-    df.dropna(subset=['original_price'], inplace=True)
-
-    # Remove rows where price is NaN 
-    df.dropna(subset=['original_price'], inplace=True)
-
-    # Remove rows where orginal_price or price is 0
-    no_price = ((df['original_price'] < 1000) | (df['price'] < 1000))
-    df = df[~no_price]
-
-    # Remove rows missing the surface and number of rooms
-    no_rooms_and_surface = ((df['rooms'].isna()) & (df['surface'].isna()))
-    df = df[~no_rooms_and_surface]
-
-    # Remove rows where the surface is over 250 m2
-    big_surface = ((df['surface'] >= 250))
-    df = df[~big_surface]
-
-    def impute_rooms(row):
-        if pd.isna(row['rooms']):
-            # Find the number of rooms with the closest average surface to the row's surface
-            closest_rooms = (average_surface_by_rooms - row['surface']).abs().idxmin()
-            return closest_rooms
-        return row['rooms']
-    
-    average_surface_by_rooms = df.groupby('rooms')['surface'].mean()
-    df['rooms'] = df.apply(impute_rooms, axis=1)
-
-    # Remove outliers
-    lower_bound = df['price'].quantile(0.05)
-    upper_bound = df['price'].quantile(0.95)
-
-    filtered_df = df[(df['price'] >= lower_bound) & (df['price'] <= upper_bound)]
-    return filtered_df
-
-df = load_data()
-filtered_df = clean_data(df)
+import sys
+import json
+import math
+import logging
+
+import streamlit as st
+
+# The app is run as a script (streamlit run src/app/app.py); make the repository root importable
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(REPO_ROOT)
+# Only the prebuilt default view is loaded up front; plotly, SQLAlchemy and pandas wait for the first interaction
+from src.data_pipeline.dashboard_artifacts import DASHBOARD_ARTIFACTS_PATH, read_artifacts
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.info("Imported the app modules in %.3fs", time.perf_counter() - SCRIPT_START)
+
+
+@st.cache_resource
+def load_interactive():
+    start = time.perf_counter()
+    from src.app import interactive
+    logging.info("Imported the interactive dashboard (plotly, SQLAlchemy, pandas) in %.3fs", time.perf_counter() - start)
+    return interactive
+
+@st.cache_resource
+def render_counter():
+    return {"renders": 0}
+
+@st.cache_data(max_entries=1)
+def load_artifacts(modified):
+    # Keyed by the file's modification time, so the weekly rebuild is picked up without a restart
+    return read_artifacts(os.path.join(REPO_ROOT, DASHBOARD_ARTIFACTS_PATH))
+
+def format_metric(value, formatter) -> str:
+    # A selection whose rows all lack the metric has no median
+    return "–" if value is None or math.isnan(value) else formatter(value)
+
+def artifacts_modified():
+    try:
+        return os.path.getmtime(os.path.join(REPO_ROOT, DASHBOARD_ARTIFACTS_PATH))
+    except OSError:
+        return None
+
+artifacts = load_artifacts(artifacts_modified())
 
 
 #intro
@@ -108,75 +54,67 @@ st.markdown('<h4 style="text-align: center;"> Finding the right summer cabin is
 
 st.markdown('This project offers you an analysis of the current Finnish real estate market for summer cabins. The data is updated weekly.')
 
+interactive = None
+if artifacts is None:
+    # Before the pipeline writes the artifacts file, the same view is built from the small dash_* tables
+    interactive = load_interactive()
+    artifacts = interactive.table_artifacts()
+
+# Filters are evaluated on the bitmap index; only the selected rows reach the charts
+active_filters = ()
+view = artifacts
+if st.sidebar.toggle("Filter listings"):
+    interactive = load_interactive()
+    filter_index, version = interactive.current_index()
+    active_filters = interactive.filter_widgets(filter_index)
+    if active_filters:
+        view = interactive.filtered_view(filter_index, active_filters)
+if active_filters:
+    st.caption(f"{view['selected']:,} of {filter_index.n_rows:,} listings match the filters")
+    if not view['selected']:
+        st.stop()
+
+headline = view['headline']
 col1, col2, col3 = st.columns(3)
-col1.metric("Median Price", '{:,.2f} €'.format(filtered_df.price.median()), "0 €")
-col2.metric("Median Surface", f"{filtered_df.surface.median()} m²")
-col3.metric("Median Year of Built", f"{int(filtered_df.year.median())}")
+col1.metric("Median Price", format_metric(headline['median_price'], '{:,.2f} €'.format), "0 €")
+col2.metric("Median Surface", format_metric(headline['median_surface'], lambda value: f"{value} m²"))
+col3.metric("Median Year of Built", format_metric(headline['median_year'], lambda value: f"{int(value)}"))
 
 
 
 # Plot 1: Distribution of Price
-fig1 = px.histogram(filtered_df, x='price', nbins=60, 
-                    title="Distribution of Price")
-
-st.plotly_chart(fig1, use_container_width=True)
+st.plotly_chart(view['figures']['price'], use_container_width=True)
 
 # Plot 2: Distribution of Surface
-fig2 = px.histogram(filtered_df, x='surface', nbins=30, 
-                    title="Distribution of Surface")
-st.plotly_chart(fig2, use_container_width=True)
+st.plotly_chart(view['figures']['surface'], use_container_width=True)
 
 # Plot 3: Distribution of Number of Rooms
-fig3 = px.histogram(filtered_df, x='rooms', nbins=20, 
-                    title="Distribution of Number of Rooms")
-st.plotly_chart(fig3, use_container_width=True)
+st.plotly_chart(view['figures']['rooms'], use_container_width=True)
 
 
 # Plot 4: Proportion of Winterized Properties
-winterized_counts = filtered_df['winterized'].value_counts(normalize=True).reset_index()
-winterized_counts.columns = ['winterized', 'proportion']
-
-fig4 = px.pie(winterized_counts, names='winterized', values='proportion', 
-              title="Proportion of Winterized Properties", 
-              labels={'winterized': 'Property Status', 'proportion': 'Proportion'})
-st.plotly_chart(fig4, use_container_width=True)
+st.plotly_chart(view['figures']['winterized'], use_container_width=True)
 
 # Plot 5: Distance from HEL
 
-# Function to convert duration to minutes
-def duration_to_minutes(duration):
-    hours = 0
-    minutes = 0
-    
-    # Extract hours and minutes using regular expressions
-    hour_match = re.search(r'(\d+)\s*hour', duration)
-    min_match = re.search(r'(\d+)\s*min', duration)
-    
-    if hour_match:
-        hours = int(hour_match.group(1))
-    if min_match:
-        minutes = int(min_match.group(1))
-    
-    # Convert to total minutes
-    return hours * 60 + minutes
-
-# Apply the conversion
-filtered_df['duration_minutes'] = filtered_df['duration'].apply(duration_to_minutes)
-
-# Create a scatter map plot
-fig5 = px.scatter_mapbox(filtered_df, lat='latitude', lon='longitude', 
-                        color='duration_minutes', 
-                        color_continuous_scale='Darkmint',  # You can choose other color scales as well
-                        size_max=8, 
-                        zoom=4,  # Adjust the zoom level as needed
-                        width=800, height=800,
-                        center= {'lat':65.5, 'lon':27},
-                        mapbox_style="carto-positron",  # You can choose other map styles
-                        title="Properties with Driving Duration to HEL Airport")
-
-# Update layout for better visualization
-fig5.update_layout(coloraxis_colorbar=dict(title="Duration (mins)"))
-st.plotly_chart(fig5, use_container_width=True)
-
-
-
+map_mode = st.radio("Map", ["Clusters", "Regions"], horizontal=True)
+map_zoom = view['zoom']
+if map_mode == "Clusters":
+    map_zoom = st.select_slider("Map detail", options=view['zoom_levels'], value=view['zoom'])
+
+# The map is the only chart needing one row per listing; it is aggregated before it reaches the browser
+if view is artifacts and map_mode == "Clusters" and map_zoom == artifacts['zoom']:
+    map_figure = artifacts['figures']['map']
+elif view is artifacts and map_mode == "Regions":
+    interactive = load_interactive()
+    map_figure = json.loads(interactive.default_region_map_json())
+else:
+    interactive = load_interactive()
+    filter_index, version = interactive.current_index()
+    map_figure = json.loads(interactive.map_figure_json(map_mode, map_zoom, version, active_filters))
+st.plotly_chart(map_figure, use_container_width=True)
+
+counter = render_counter()
+counter['renders'] += 1
+logging.info("Rendered the %s view in %.3fs (%s)", "prebuilt" if interactive is None else "interactive",
+             time.perf_counter() - SCRIPT_START, "first render" if counter['renders'] == 1 else f"run {counter['renders']}")
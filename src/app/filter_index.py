@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+# Columns filtered by a range slider, and by a choice of values
+RANGE_COLUMNS = ['price', 'surface', 'duration_min', 'hospital_km']
+VALUE_COLUMNS = ['rooms', 'winterized', 'region']
+# Slider stops per range column; stops are quantiles, so each bucket holds about as many listings
+RANGE_BUCKETS = 48
+STOP_SIGNIFICANT_DIGITS = 2
+
+
+def pack(mask: np.ndarray) -> np.ndarray:
+    """A boolean row mask as a bitmap of 64-bit words."""
+    packed = np.packbits(mask, bitorder='little')
+    return np.pad(packed, (0, -len(packed) % 8)).view(np.uint64)
+
+def range_stops(values: np.ndarray, buckets: int = RANGE_BUCKETS) -> np.ndarray:
+    """Slider stops from the minimum to the maximum value: quantiles rounded to a few significant digits."""
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return np.array([0.0])
+    quantiles = np.quantile(values, np.linspace(0, 1, buckets + 1)[1:-1])
+    with np.errstate(divide='ignore'):
+        magnitude = 10 ** (np.floor(np.log10(np.abs(quantiles))) - STOP_SIGNIFICANT_DIGITS + 1)
+    rounded = np.where(quantiles == 0, 0, np.round(quantiles / np.where(quantiles == 0, 1, magnitude)) * magnitude)
+    low, high = values.min(), values.max()
+    return np.unique(np.concatenate([[low], rounded[(rounded > low) & (rounded < high)], [high]]))
+
+
+class BitmapIndex:
+    """Packed bitmaps of the dashboard rows, intersected to evaluate any combination of filters.
+
+    A range column keeps one cumulative bitmap per slider stop: at_most[j]
+    holds the rows whose value is at most stops[j], and at_most[0] is empty.
+    Selecting stops (low, high) is then at_most[high] & ~at_most[low], which
+    includes the upper stop and excludes the lower one, except the lowest stop.
+    A value column keeps one bitmap per value; selected values are OR-ed.
+    Rows with a missing value only pass the filters left at their full range.
+    """
+
+    def __init__(self, df: pd.DataFrame, range_columns: list = RANGE_COLUMNS, value_columns: list = VALUE_COLUMNS,
+                 buckets: int = RANGE_BUCKETS):
+        self.df = df.reset_index(drop=True)
+        self.n_rows = len(self.df)
+        self.all_rows = pack(np.ones(self.n_rows, dtype=bool))
+        self.stops, self.at_most = {}, {}
+        for column in range_columns:
+            values = self.df[column].to_numpy(dtype=float)
+            stops = range_stops(values, buckets)
+            # Bucket j holds the values in (stops[j-1], stops[j]]; the minimum goes to bucket 1, missing values to none
+            bucket = np.maximum(np.searchsorted(stops, values, side='left'), 1)
+            bucket[np.isnan(values)] = len(stops)
+            self.stops[column] = stops
+            self.at_most[column] = np.stack([pack(bucket <= j) for j in range(len(stops))])
+            self.at_most[column][0] = 0
+        self.values, self.bitmaps, self.not_null = {}, {}, {}
+        for column in value_columns:
+            codes, uniques = pd.factorize(self.df[column], sort=True)
+            self.not_null[column] = pack(codes >= 0)
+            self.values[column] = list(uniques)
+            self.bitmaps[column] = {value: pack(codes == code) for code, value in enumerate(uniques)}
+
+    def active(self, filters: dict) -> tuple:
+        """The filters that exclude something, as a hashable key: (column, (low, high)) or (column, values)."""
+        key = []
+        for column, selected in filters.items():
+            if column in self.stops:
+                stops = self.stops[column]
+                low, high = np.searchsorted(stops, selected[0]), np.searchsorted(stops, selected[1])
+                if low > 0 or high < len(stops) - 1:
+                    key.append((column, (int(low), int(high))))
+            elif selected and set(selected) != set(self.values[column]):
+                key.append((column, tuple(sorted(selected, key=self.values[column].index))))
+        return tuple(key)
+
+    def select(self, active: tuple) -> np.ndarray:
+        """Bitmap of the rows passing every filter of an active() key."""
+        selection, scratch = self.all_rows.copy(), np.empty_like(self.all_rows)
+        for column, selected in active:
+            if column in self.stops:
+                low, high = selected
+                np.bitwise_and(selection, self.at_most[column][high], out=selection)
+                np.bitwise_and(selection, np.invert(self.at_most[column][low], out=scratch), out=selection)
+                continue
+            # OR the smaller side: the selected values, or the excluded values and missing rows to remove
+            excluded = [value for value in self.values[column] if value not in selected]
+            if len(excluded) < len(selected):
+                np.invert(self.not_null[column], out=scratch)
+                for value in excluded:
+                    np.bitwise_or(scratch, self.bitmaps[column][value], out=scratch)
+                np.invert(scratch, out=scratch)
+            else:
+                scratch[:] = 0
+                for value in selected:
+                    np.bitwise_or(scratch, self.bitmaps[column][value], out=scratch)
+            np.bitwise_and(selection, scratch, out=selection)
+        return selection
+
+    def count(self, selection: np.ndarray) -> int:
+        return int(np.bitwise_count(selection).sum())
+
+    def rows(self, selection: np.ndarray) -> pd.DataFrame:
+        """The selected rows of the indexed frame."""
+        mask = np.unpackbits(selection.view(np.uint8), count=self.n_rows, bitorder='little').view(bool)
+        return self.df[mask]
@@ -0,0 +1,66 @@
+import time
+import threading
+
+import pandas as pd
+from sqlalchemy import text
+
+from src.data_pipeline.dashboard_aggregates import clean_rows
+
+# Columns the map, the filtered charts and clean_rows need from cabins_main
+MAP_QUERY_COLUMNS = ['url', 'latitude', 'longitude', 'duration_min', 'distance', 'price', 'original_price',
+                     'rooms', 'surface', 'year', 'winterized', 'region', 'hospital_km', 'last_posting_date']
+
+
+class IncrementalLoader:
+    """A cleaned copy of cabins_main, topped up at most once per TTL with the rows posted since the last watermark.
+
+    update_data stamps every row of a snapshot with its last_posting_date, so
+    the rows posted on or after the watermark hold everything the weekly
+    update inserted or rewrote. Rows of the watermark date itself are read
+    again, since a load may still have been running when they were first
+    read; a hash per row tells the actual changes apart. version counts the
+    changes, as a cache key for whatever is derived from the rows.
+    """
+
+    def __init__(self, engine, ttl: float, columns: list = MAP_QUERY_COLUMNS, table: str = 'cabins_main'):
+        self.engine = engine
+        self.ttl = ttl
+        self.columns = columns
+        self.table = table
+        self.df = None
+        self.watermark = None
+        self.version = 0
+        self.hashes = pd.Series(dtype='uint64')
+        self.refreshed_at = None
+        self.lock = threading.Lock()
+
+    def _fetch(self) -> pd.DataFrame:
+        query = f"SELECT {', '.join(self.columns)} FROM {self.table}"
+        if self.watermark is None:
+            return pd.read_sql(text(query), self.engine)
+        return pd.read_sql(text(query + " WHERE last_posting_date >= :watermark"), self.engine,
+                           params={"watermark": self.watermark})
+
+    def refresh(self, force: bool = False) -> pd.DataFrame:
+        """Return the cached rows, merging in the changed ones first if the TTL has expired."""
+        with self.lock:
+            if not force and self.refreshed_at is not None and time.monotonic() - self.refreshed_at < self.ttl:
+                return self.df
+            delta = self._fetch()
+            self.refreshed_at = time.monotonic()
+            hashes = pd.util.hash_pandas_object(delta, index=False).set_axis(delta['url'])
+            delta = delta[(hashes != self.hashes.reindex(hashes.index)).to_numpy()]
+            if delta.empty and self.df is not None:
+                return self.df
+
+            # Changed listings replace their cached row, or drop it if they no longer pass the cleaning
+            cleaned = clean_rows(delta).set_index('url')
+            if self.df is None:
+                self.df = cleaned
+            else:
+                self.df = pd.concat([self.df[~self.df.index.isin(delta['url'])], cleaned])
+            self.hashes = pd.concat([self.hashes[~self.hashes.index.isin(hashes.index)], hashes])
+            if not delta.empty:
+                self.watermark = pd.to_datetime(delta['last_posting_date']).max().date()
+            self.version += 1
+            return self.df
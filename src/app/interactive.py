@@ -0,0 +1,138 @@
+"""Database-backed part of the dashboard, imported by app.py on the first interaction only."""
+import os
+import json
+from dotenv import load_dotenv
+
+import pandas as pd
+import streamlit as st
+import plotly.express as px
+from sqlalchemy import create_engine
+
+from src.app.incremental_loader import IncrementalLoader
+from src.app.filter_index import BitmapIndex
+from src.data_pipeline.dashboard_aggregates import (artifacts_from_tables, finish_listings, headline_metrics, histogram_bins,
+                                                    winterized_shares)
+from src.data_pipeline.dashboard_artifacts import (FIGURE_TEMPLATE, HISTOGRAM_TITLES, MAP_CENTER, MAP_LAYOUT, MAP_STYLE,
+                                                   cluster_map_figure, histogram_figure, winterized_figure)
+from src.data_pipeline.map_aggregation import DEFAULT_ZOOM, ZOOM_CELL_SIZES, precompute_grids, region_summary
+from src.data_pipeline.regions import REGIONS_PATH, Regions
+
+# Load environment variables from the .env file (if present)
+load_dotenv()
+
+# Access environment variables
+POSTGRES_USER = os.getenv('PostgreSQL_USERNAME')
+POSTGRES_PSW = os.getenv('PostgreSQL_PSW')
+POSTGRES_SERVER = os.getenv('PostgreSQL_SERVER')
+POSTGRES_PORT = os.getenv('PostgreSQL_PORT')
+POSTGRES_DATABASE = os.getenv('PostgreSQL_DATABASE')
+
+# Seconds before the dashboard checks the database for the weekly update again
+REFRESH_TTL = int(os.getenv('Streamlit_Refresh_TTL', 3600))
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Sidebar filters and their labels
+RANGE_FILTERS = {"price": "Price (€)", "surface": "Surface (m²)", "duration_min": "Drive time to HEL (mins)",
+                 "hospital_km": "Km to hospital"}
+VALUE_FILTERS = {"rooms": "Rooms", "winterized": "Winterized", "region": "Region"}
+# Small tables refresh_aggregates writes at update time
+DASHBOARD_TABLES = ['dash_headline', 'dash_histogram', 'dash_winterized', 'dash_region_stats', 'dash_map_grid']
+
+
+@st.cache_resource
+def get_engine():
+    db_url = f"postgresql://{POSTGRES_USER}:{POSTGRES_PSW}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DATABASE}"
+
+    # Create a SQLAlchemy engine
+    return create_engine(db_url)
+
+@st.cache_resource
+def get_map_loader():
+    return IncrementalLoader(get_engine(), REFRESH_TTL)
+
+@st.cache_resource
+def get_regions():
+    return Regions.load(os.path.join(REPO_ROOT, REGIONS_PATH))
+
+@st.cache_resource
+def get_region_shapes():
+    # Simplified for the browser: about 45 KB instead of the 880 KB the listings are tagged with
+    return get_regions().display_geojson()
+
+@st.cache_data(ttl=REFRESH_TTL)
+def dashboard_tables() -> dict:
+    engine = get_engine()
+    return {name: pd.read_sql_table(name, engine) for name in DASHBOARD_TABLES}
+
+def table_artifacts() -> dict:
+    """The default view built from the dash_* tables, for when the pipeline has not written the artifacts file."""
+    return artifacts_from_tables(dashboard_tables())
+
+@st.cache_resource(max_entries=2)
+def get_filter_index(version):
+    # Built once per weekly update; every widget change then only intersects bitmaps.
+    # The loader already ran clean_rows on each row as it arrived: only the statistics over every row are recomputed
+    return BitmapIndex(finish_listings(get_map_loader().df.reset_index()))
+
+def current_index():
+    """The filter index of the latest data, topping up the cached rows first if the TTL has expired."""
+    map_loader = get_map_loader()
+    map_loader.refresh()
+    return get_filter_index(map_loader.version), map_loader.version
+
+@st.cache_data(max_entries=8)
+def map_aggregates(version, active_filters):
+    # The version moves whenever the cached rows change, so cached aggregates never outlive their data
+    index = get_filter_index(version)
+    points = index.rows(index.select(active_filters))
+    return precompute_grids(points), region_summary(points, get_regions())
+
+@st.cache_data(max_entries=32)
+def map_figure_json(mode, zoom, version, active_filters):
+    # Markers per grid cell or one shape per region: the payload does not grow with the number of listings
+    grids, regions_df = map_aggregates(version, active_filters)
+    if mode == "Clusters":
+        return json.dumps(cluster_map_figure(grids[zoom], zoom))
+    return region_map_json(regions_df)
+
+@st.cache_data(ttl=REFRESH_TTL)
+def default_region_map_json():
+    # Every listing's regions are pre-aggregated in dash_region_stats: the rows themselves are not needed
+    return region_map_json(dashboard_tables()['dash_region_stats'])
+
+def region_map_json(regions_df) -> str:
+    fig = px.choropleth_mapbox(regions_df, geojson=get_region_shapes(), locations='region',
+                               color='median_duration_min', hover_data=['listings', 'median_price'],
+                               opacity=0.7, zoom=DEFAULT_ZOOM, center=MAP_CENTER, mapbox_style=MAP_STYLE)
+    fig.update_layout(template=FIGURE_TEMPLATE, **MAP_LAYOUT)
+    return fig.to_json()
+
+def format_stop(value):
+    return f"{value:,.0f}" if abs(value) >= 10 else f"{value:g}"
+
+def filter_widgets(index) -> tuple:
+    """Draw the sidebar filters and return the active ones."""
+    filters = {}
+    with st.sidebar:
+        for column, label in RANGE_FILTERS.items():
+            stops = index.stops[column].tolist()
+            filters[column] = st.select_slider(label, options=stops, value=(stops[0], stops[-1]), format_func=format_stop)
+        for column, label in VALUE_FILTERS.items():
+            filters[column] = st.multiselect(label, index.values[column], placeholder="All")
+    return index.active(filters)
+
+def filtered_view(index, active_filters) -> dict:
+    """Headline metrics and figures of the selected listings, shaped like the prebuilt artifacts."""
+    selection = index.select(active_filters)
+    selected = index.rows(selection)
+    histogram = histogram_bins(selected)
+    return {
+        "selected": index.count(selection),
+        "zoom": DEFAULT_ZOOM,
+        "zoom_levels": list(ZOOM_CELL_SIZES),
+        "headline": headline_metrics(selected),
+        "figures": {
+            **{metric: histogram_figure(histogram, metric) for metric in HISTOGRAM_TITLES},
+            "winterized": winterized_figure(winterized_shares(selected)),
+        },
+    }
@@ -0,0 +1,131 @@
+"""Rebuild the processed snapshots from the raw etuovi_data_* crawl feeds.
+
+Parsing and metric extraction run in a process pool across snapshots; only the
+stateful history merge is replayed sequentially, in chronological order.
+Coordinates and routes are reused from the stored snapshots, so a backfill
+makes no API calls. The store is generated data and is not committed: on a
+fresh checkout it is seeded from the weekly etuovi_data_*.csv files first.
+
+Run from the repository root:  python -m src.data_pipeline.backfill [--dry-run | --route-metrics]
+"""
+import os
+import time
+import logging
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from src.data_pipeline.feeds import find_snapshots, read_snapshot
+from src.data_pipeline.cabins_transform import process_listings, merge_and_update_data
+from src.data_pipeline.listing_history import HISTORY_PATH, empty_history, save_history, update_history
+from src.data_pipeline.snapshot_store import STORE_DIR, load_snapshot, migrate_csv_snapshots, read_manifest, write_snapshot
+from src.data_pipeline.property_dedup import ROUTE_COLUMNS, deduplicate
+from src.data_pipeline.drive_time_estimator import route_metrics
+from src.data_pipeline.regions import assign_regions
+from src.data_pipeline.healthcare_features import HEALTHCARE_COLUMNS, healthcare_features
+from src.data_pipeline.price_events import PRICE_EVENTS_DIR, append_price_events, diff_prices
+
+# Configuration and Constants
+# Columns compared against the existing weekly CSVs
+VERIFY_COLUMNS = ['address', 'description', 'rooms', 'winterized', 'price', 'surface', 'year',
+                  'original_price', 'latitude', 'longitude', 'distance', 'duration',
+                  'first_posting_date', 'last_posting_date']
+
+
+def parse_snapshot(timestamp: str) -> tuple:
+    """Parse one raw snapshot; runs in a worker process."""
+    listings, details = read_snapshot(timestamp)
+    return timestamp, process_listings(listings, details)
+
+def load_route_reference(store_dir: str = STORE_DIR) -> pd.DataFrame:
+    """Coordinates and routes of every URL in every stored snapshot."""
+    return load_snapshot('all', columns=['url'] + ROUTE_COLUMNS, store_dir=store_dir)
+
+def fill_routes(final_df: pd.DataFrame, reference: pd.DataFrame, snapshot_date) -> pd.DataFrame:
+    """Reuse the stored coordinates and routes: those of the same snapshot first, then the history's, then the latest known."""
+    same_snapshot = reference[reference['snapshot_date'] == pd.Timestamp(snapshot_date)].set_index('url').reindex(final_df['url'])
+    latest = reference.drop(columns='snapshot_date').groupby('url').last().reindex(final_df['url'])
+
+    stored = same_snapshot['latitude'].notna().to_numpy()
+    final_df.loc[stored, ROUTE_COLUMNS] = same_snapshot.loc[stored, ROUTE_COLUMNS].to_numpy()
+    unknown = final_df['latitude'].isna().to_numpy()
+    final_df.loc[unknown, ROUTE_COLUMNS] = latest.loc[unknown, ROUTE_COLUMNS].to_numpy()
+    return final_df
+
+def compare_with_csv(final_df: pd.DataFrame, csv_path: str) -> dict:
+    """Count the rows whose value differs from the existing CSV, per column."""
+    expected = pd.read_csv(csv_path).set_index('url')
+    actual = final_df.set_index('url').reindex(expected.index)
+    mismatches = {"missing_urls": int(expected.index.difference(final_df['url']).size)}
+    for column in VERIFY_COLUMNS:
+        left, right = actual[column], expected[column]
+        if column.endswith('_date'):
+            left, right = pd.to_datetime(left), pd.to_datetime(right)
+        elif pd.api.types.is_numeric_dtype(right):
+            left = pd.to_numeric(left, errors='coerce')
+        same = (left == right) | (left.isna() & right.isna())
+        mismatches[column] = int((~same.fillna(False)).sum())
+    return mismatches
+
+def backfill(workers: int = None, dry_run: bool = False, store_dir: str = STORE_DIR, folder: str = 'data/cabins') -> dict:
+    """Replay every raw snapshot in chronological order; returns the per-snapshot CSV comparison."""
+    start = time.perf_counter()
+    timestamps = sorted(find_snapshots(folder))
+    if not read_manifest(store_dir):
+        # The CSVs hold the coordinates and routes the APIs returned at the time
+        logging.info("Seeded the empty store with %d CSV snapshots", migrate_csv_snapshots(folder, store_dir))
+    reference = load_route_reference(store_dir)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parsed = dict(executor.map(parse_snapshot, timestamps))
+    parse_time = time.perf_counter() - start
+
+    history = empty_history()
+    report = {}
+    for timestamp in timestamps:
+        snapshot_date = datetime.strptime(timestamp, '%Y%m%d-%H%M%S').date()
+        final_df = fill_routes(merge_and_update_data(history, parsed[timestamp], snapshot_date), reference, snapshot_date)
+        final_df['property_id'] = deduplicate(final_df, history)
+        final_df[['distance_km', 'duration_min']] = route_metrics(final_df)
+        final_df['region'] = assign_regions(final_df)
+        final_df[HEALTHCARE_COLUMNS] = healthcare_features(final_df)
+        events = diff_prices(history, final_df)
+        history = update_history(history, final_df)
+
+        csv_path = os.path.join(folder, f'etuovi_data_{timestamp}.csv')
+        if os.path.exists(csv_path):
+            report[timestamp] = compare_with_csv(final_df, csv_path)
+            logging.info("%s: %d listings, mismatches against CSV: %s", timestamp, len(final_df),
+                         {column: count for column, count in report[timestamp].items() if count})
+        if not dry_run:
+            write_snapshot(final_df, timestamp, store_dir)
+            append_price_events(events, timestamp, os.path.join(store_dir, os.path.basename(PRICE_EVENTS_DIR)), replace=True)
+
+    if not dry_run:
+        save_history(history, os.path.join(store_dir, os.path.basename(HISTORY_PATH)))
+    logging.info("Backfilled %d snapshots in %.2fs (parsing %.2fs)", len(timestamps), time.perf_counter() - start, parse_time)
+    return report
+
+def backfill_route_metrics(store_dir: str = STORE_DIR) -> int:
+    """Add the numeric distance_km and duration_min columns to every stored snapshot, without replaying the feeds."""
+    snapshots = read_manifest(store_dir)
+    for entry in snapshots:
+        df = load_snapshot(entry['snapshot_date'], store_dir=store_dir)
+        df[['distance_km', 'duration_min']] = route_metrics(df)
+        write_snapshot(df, entry['snapshot'], store_dir)
+        logging.info("Added route metrics to snapshot %s", entry['snapshot_date'])
+    return len(snapshots)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=None, help="parser processes (default: one per CPU)")
+    parser.add_argument('--dry-run', action='store_true', help="only compare with the existing CSVs, write nothing")
+    parser.add_argument('--route-metrics', action='store_true', help="only add distance_km and duration_min to the stored snapshots")
+    args = parser.parse_args()
+    if args.route_metrics:
+        backfill_route_metrics()
+    else:
+        backfill(workers=args.workers, dry_run=args.dry_run)
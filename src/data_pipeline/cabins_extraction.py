@@ -5,31 +5,116 @@ import logging
 import re
 from datetime import datetime
 from collections import Counter
+from dataclasses import asdict
+from urllib.parse import parse_qs, urlencode, urlparse
 
+import requests
 import scrapy  # type: ignore
 from scrapy.crawler import CrawlerRunner  # type: ignore
-from selenium import webdriver  # type: ignore
-from selenium.webdriver.common.by import By  # type: ignore
-from selenium.webdriver.common.keys import Keys  # type: ignore
-from selenium.webdriver.support.ui import WebDriverWait  # type: ignore
-from selenium.webdriver.support import expected_conditions as EC  # type: ignore
 from twisted.internet import reactor, defer  # type: ignore
 
+from src.data_pipeline.crawl_state import CrawlStateStore, listing_card_hash, STATE_DB_PATH
+from src.data_pipeline.feeds import CabinListing, ListingDetails, feed_paths, iter_json_lines
+
 # Configuration and Constants
 DOWNLOAD_DIR = os.path.abspath("data/cabins")
 START_URL = 'https://www.etuovi.com/myytavat-loma-asunnot'
 BASE_URL = 'https://www.etuovi.com'
 TIME_STAMP = datetime.now().strftime("%Y%m%d-%H%M%S")
-FILENAME = f"etuovi_data_{TIME_STAMP}.json"
-FILE_PATH = os.path.join(DOWNLOAD_DIR, FILENAME)
+# One JSON-lines stream per spider
+LISTINGS_FILE_PATH, DETAILS_FILE_PATH = feed_paths(TIME_STAMP, DOWNLOAD_DIR)
+
+# Search URL resolution: the filtered search ("Mökki tai huvila" + "Järvi") is
+# assembled from its query parameters and cached on disk; Selenium is only used
+# when neither the cached nor the assembled URL passes the validity check.
+SEARCH_URL = f'{START_URL}/tulokset'
+SEARCH_PARAMS = {
+    'vapaa-ajan-asunnon-tyypit': 'MOKKI_TAI_HUVILA',
+    'rantatyypit': 'JARVI',
+}
+CACHE_DIR = os.path.abspath("data/cache")
+SEARCH_URL_CACHE = os.path.join(CACHE_DIR, "etuovi_search_url.json")
+SEARCH_URL_TTL_DAYS = 7
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.79 Safari/537.36'
 
 LOGGING_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 logging.basicConfig(level=logging.INFO, format=LOGGING_FORMAT)
 
 
 
+def build_etuovi_url(params: dict = None) -> str:
+    """Assemble the filtered search URL from its known query parameters."""
+    return f"{SEARCH_URL}?{urlencode(params or SEARCH_PARAMS)}"
+
+def keeps_query(url: str, final_url: str) -> bool:
+    """Check that the URL a request ended at still carries every query parameter of the requested URL."""
+    requested, final = parse_qs(urlparse(url).query), parse_qs(urlparse(final_url).query)
+    return all(set(values) <= set(final.get(name, [])) for name, values in requested.items())
+
+def is_valid_etuovi_url(url: str) -> bool:
+    """Check that a search URL still answers with a page of listings, filtered as requested.
+
+    An unknown filter may be dropped by a redirect to the unfiltered search,
+    which also lists cabins: the final URL must keep the filters of the
+    requested one, whichever parameter names (builder or Selenium) it uses.
+    """
+    try:
+        response = requests.get(url, headers={'User-Agent': USER_AGENT}, timeout=30)
+    except requests.RequestException as e:
+        logging.warning("Unable to validate search URL %s: %s", url, e)
+        return False
+    if response.status_code != 200 or '/kohde/' not in response.text:
+        return False
+    if not keeps_query(url, response.url):
+        logging.warning("Search URL %s ended at %s without its filters", url, response.url)
+        return False
+    return True
+
+def load_cached_url(max_age_days: int = SEARCH_URL_TTL_DAYS) -> str:
+    """Return the cached search URL if it is recent enough, otherwise None."""
+    try:
+        with open(SEARCH_URL_CACHE) as f:
+            cached = json.load(f)
+        resolved_at = datetime.fromisoformat(cached['resolved_at'])
+    except (OSError, ValueError, KeyError):
+        return None
+    if (datetime.now() - resolved_at).days >= max_age_days:
+        return None
+    return cached['url']
+
+def save_cached_url(url: str, source: str):
+    """Persist a resolved search URL together with how it was obtained."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(SEARCH_URL_CACHE, 'w') as f:
+        json.dump({"url": url, "source": source, "resolved_at": datetime.now().isoformat()}, f)
+
+def resolve_etuovi_url() -> str:
+    """Resolve the search URL from the cache, the URL builder or, as a last resort, Selenium."""
+    cached_url = load_cached_url()
+    if cached_url and is_valid_etuovi_url(cached_url):
+        logging.info("Using cached search URL: %s", cached_url)
+        return cached_url
+
+    built_url = build_etuovi_url()
+    if is_valid_etuovi_url(built_url):
+        logging.info("Using assembled search URL: %s", built_url)
+        save_cached_url(built_url, "builder")
+        return built_url
+
+    logging.warning("Assembled search URL failed validation, falling back to Selenium")
+    etuovi_url = get_etuovi_url()
+    save_cached_url(etuovi_url, "selenium")
+    return etuovi_url
+
 def get_etuovi_url() -> str:
     """Retrieve the URL for cabin listings on Etuovi.com."""
+    from selenium import webdriver  # type: ignore
+    from selenium.webdriver.common.by import By  # type: ignore
+    from selenium.webdriver.common.keys import Keys  # type: ignore
+    from selenium.webdriver.support.ui import WebDriverWait  # type: ignore
+    from selenium.webdriver.support import expected_conditions as EC  # type: ignore
+
     options = webdriver.FirefoxOptions()
     options.set_preference("browser.download.folderList", 2)
     options.set_preference("browser.download.manager.showWhenStarting", False)
@@ -77,9 +162,34 @@ def get_etuovi_url() -> str:
     return etuovi_url
 
 
+def log_crawl_stats(spider: scrapy.Spider):
+    """Record the crawl wall time and page throughput in the spider's stats."""
+    stats = spider.crawler.stats
+    start_time = stats.get_value('start_time')
+    if start_time is None:
+        return
+    wall_time = (datetime.now(start_time.tzinfo) - start_time).total_seconds()
+    pages = stats.get_value('response_received_count', 0)
+    pages_per_sec = pages / wall_time if wall_time > 0 else 0.0
+
+    stats.set_value('crawl/wall_time_seconds', round(wall_time, 2))
+    stats.set_value('crawl/pages_per_second', round(pages_per_sec, 3))
+    logging.info("%s crawled %d pages in %.1fs (%.2f pages/sec)", spider.name, pages, wall_time, pages_per_sec)
+
+
 class EtuoviSpider(scrapy.Spider):
     name = "all_listings"
-    start_urls = [get_etuovi_url()]
+    custom_settings = {
+        "FEEDS": {LISTINGS_FILE_PATH: {"format": "jsonlines", "encoding": "utf8", "item_classes": [CabinListing]}}
+    }
+
+    def __init__(self, start_url, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Resolved before the crawl starts: resolve_etuovi_url blocks, and would stall the reactor
+        self.start_url = start_url
+
+    def start_requests(self):
+        yield scrapy.Request(self.start_url, callback=self.parse)
 
     def parse(self, response):
         elements_with_classes = response.xpath('//*[@class]')
@@ -90,16 +200,19 @@ class EtuoviSpider(scrapy.Spider):
         results = response.css(f'div.{filtered_classes[0]}')
 
         for r in results:
-            cabin = {
-                "address": r.css('h4::text').get(),
-                "url": BASE_URL + r.css('a::attr(href)').get().split("?haku")[0],
-                "metrics": r.css('span::text').getall(),
-                "description": r.css('h5::text').get()
-            }
-            yield cabin
+            yield CabinListing(
+                address=r.css('h4::text').get(),
+                url=BASE_URL + r.css('a::attr(href)').get().split("?haku")[0],
+                metrics=r.css('span::text').getall(),
+                description=r.css('h5::text').get()
+            )
 
         current_url = response.request.url
 
+        # Only the first results page schedules the rest of the pagination
+        if re.search("&sivu=[0-9]{1,10}", current_url):
+            return
+
         last_page_xpath = '/html/body/div[2]/div/div/div[3]/div/div[2]/div[3]/div[1]/div[3]/div[1]/div[6]/button'
 
         try:
@@ -108,57 +221,109 @@ class EtuoviSpider(scrapy.Spider):
             logging.warning("Unable to retrieve last page: %s", e)
             return
 
-        if re.search("&sivu=[0-9]{1,10}", current_url):
-            end = re.search(r'\d+$', current_url)
-            index = int(end.group(0)) + 1 if end else 2
-            if index <= last_page_number:
-                next_page = re.sub("&sivu=[0-9]{1,10}", "", current_url) + f"&sivu={index}"
-                yield response.follow(next_page, callback=self.parse)
-        else:
-            next_page = f"{current_url}&sivu=2"
-            yield response.follow(next_page, callback=self.parse)
+        logging.info("Scheduling %d result pages", last_page_number - 1)
+        for index in range(2, last_page_number + 1):
+            yield response.follow(f"{current_url}&sivu={index}", callback=self.parse)
+
+    def closed(self, reason):
+        log_crawl_stats(self)
 
 class ListingsSpider(scrapy.Spider):
     name = "listing_details"
+    custom_settings = {
+        "FEEDS": {DETAILS_FILE_PATH: {"format": "jsonlines", "encoding": "utf8", "item_classes": [ListingDetails]}}
+    }
+    # 304 responses are answers to conditional requests, not errors
+    handle_httpstatus_list = [304]
 
-    def __init__(self, urls, *args, **kwargs):
+    def __init__(self, urls, card_hashes=None, state_path=STATE_DB_PATH, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.start_urls = urls
+        self.card_hashes = card_hashes or {}
+        self.state = CrawlStateStore(state_path)
+        self.known = self.state.get_many(urls)
+        self.skipped = 0
+
+    def start_requests(self):
+        for url in self.start_urls:
+            known = self.known.get(url)
+            card_hash = self.card_hashes.get(url)
+            if self.state.is_fresh(known, card_hash):
+                # Unchanged listings are replayed through a local data: request so that
+                # their stored details still reach the feed without touching the site
+                self.skipped += 1
+                yield scrapy.Request("data:,", callback=self.reuse_state, cb_kwargs={"url": url}, dont_filter=True)
+                continue
+
+            headers = {}
+            if known and known['etag']:
+                headers['If-None-Match'] = known['etag']
+            if known and known['last_modified']:
+                headers['If-Modified-Since'] = known['last_modified']
+            yield scrapy.Request(url, headers=headers, callback=self.parse)
+
+    def reuse_state(self, response, url):
+        known = self.known[url]
+        yield ListingDetails(url=url, rooms=known['rooms'], winterized=known['winterized'])
 
     def parse(self, response):
+        url = response.request.url
+        card_hash = self.card_hashes.get(url)
+
+        if response.status == 304 and url in self.known:
+            self.state.record_not_modified(url, card_hash)
+            yield from self.reuse_state(response, url)
+            return
+
         winterized = "YES" if float(response.xpath('count(//text()[normalize-space() = "Kohde on talviasuttava"])').extract()[0]) >= 2 else "NO"
 
-        details = {
-            "url": response.request.url,
-            "rooms": response.xpath('//div[descendant::em[contains(text(), "Huoneita")]]/following-sibling::div[1]//text()').extract_first(),
-            "winterized": winterized
-        }
+        details = ListingDetails(
+            url=url,
+            rooms=response.xpath('//div[descendant::em[contains(text(), "Huoneita")]]/following-sibling::div[1]//text()').extract_first(),
+            winterized=winterized
+        )
+        self.state.record_fetch(
+            url, asdict(details), card_hash,
+            etag=response.headers.get('ETag', b'').decode() or None,
+            last_modified=response.headers.get('Last-Modified', b'').decode() or None
+        )
         yield details
 
+    def closed(self, reason):
+        self.state.close()
+        logging.info("Reused stored details for %d unchanged listings", self.skipped)
+        log_crawl_stats(self)
+
 class CrawlerScript:
     def __init__(self):
-        self.filename = FILENAME
+        self.listings_path = LISTINGS_FILE_PATH
+        self.details_path = DETAILS_FILE_PATH
         self.settings = {
-            'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.79 Safari/537.36',
+            'USER_AGENT': USER_AGENT,
             'LOG_LEVEL': logging.INFO,
-            'DOWNLOAD_DELAY': 3,
+            # Politeness comes from bounded concurrency and AutoThrottle rather
+            # than a fixed delay, so independent pages can be fetched in parallel
+            'CONCURRENT_REQUESTS_PER_DOMAIN': 8,
+            'AUTOTHROTTLE_ENABLED': True,
+            'AUTOTHROTTLE_START_DELAY': 1,
+            'AUTOTHROTTLE_MAX_DELAY': 30,
+            'AUTOTHROTTLE_TARGET_CONCURRENCY': 4.0,
             'ROBOTSTXT_OBEY': False,
-            "FEEDS": {
-                FILE_PATH: {"format": "json"}
-            }
         }
         self.runner = CrawlerRunner(self.settings)
         self.listing_data = []
 
     def run(self):
+        start_url = resolve_etuovi_url()
+
         @defer.inlineCallbacks
         def crawl():
-            yield self.runner.crawl(EtuoviSpider)
-            with open(FILE_PATH) as f:
-                self.listing_data = json.load(f)
+            yield self.runner.crawl(EtuoviSpider, start_url=start_url)
+            self.listing_data = list(iter_json_lines(self.listings_path))
             urls = [listing['url'] for listing in self.listing_data]
+            card_hashes = {listing['url']: listing_card_hash(listing) for listing in self.listing_data}
             logging.info("The number of listing URLs is: %d", len(urls))
-            yield self.runner.crawl(ListingsSpider, urls=urls)
+            yield self.runner.crawl(ListingsSpider, urls=urls, card_hashes=card_hashes)
             reactor.stop()
 
         crawl()
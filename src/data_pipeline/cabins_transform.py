@@ -1,15 +1,38 @@
 import os
 import re
+import json
+import hashlib
 from datetime import datetime
-from glob import glob
 import logging
+from typing import Iterable
 
+import numpy as np
 import pandas as pd
-import requests
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
 from dotenv import load_dotenv
 
+from src.data_pipeline.geocode_cache import GeocodeCache
+from src.data_pipeline.geocoding import GeocodingEngine
+from src.data_pipeline.routing import get_distances_and_times
+from src.data_pipeline.drive_time_estimator import estimate_missing_routes, route_metrics
+from src.data_pipeline.feeds import find_snapshots, read_snapshot
+from src.data_pipeline.listing_history import load_history, save_history, update_history
+from src.data_pipeline.snapshot_store import load_snapshot, write_snapshot
+from src.data_pipeline.property_dedup import ROUTE_COLUMNS, deduplicate, share_property_routes
+from src.data_pipeline.regions import assign_regions
+from src.data_pipeline.healthcare_features import HEALTHCARE_COLUMNS, healthcare_features
+from src.data_pipeline.price_events import append_price_events, diff_prices
+
+LISTING_COLUMNS = ['address', 'url', 'metrics', 'description']
+DETAILS_COLUMNS = ['url', 'rooms', 'winterized']
+OUTPUT_COLUMNS = [
+    'address', 'url', 'description', 'rooms', 'winterized', 'price', 'surface', 'year', 'original_price',
+    'latitude', 'longitude', 'distance', 'duration', 'distance_km', 'duration_min',
+    'first_posting_date', 'last_posting_date', 'route_estimated', 'fingerprint', 'property_id', 'region',
+    *HEALTHCARE_COLUMNS,
+]
+FINGERPRINT_COLUMNS = ['address', 'metrics', 'description', 'rooms', 'winterized']
+YEAR_PATTERN = re.compile(r'\d{4}')
+
 def load_environment_variables():
     """Load environment variables from the .env file."""
     load_dotenv()
@@ -19,103 +42,83 @@ def load_environment_variables():
         "origin": 'place_id:ChIJsaJij2X4jUYRlrMoLAHZ8Ps'  # Helsinki Airport place_id
     }
 
-def find_price(metrics: list) -> float:
-    """Extract price from metrics."""
-    price = next((i.replace('€', '').replace('\xa0', '').replace(',', '.').strip() for i in metrics if '€' in i), pd.NA)
-    return float(price) if not pd.isna(price) else price
-
-def find_surface(metrics: list) -> float:
-    """Extract surface area from metrics."""
-    surface = next((i.split(' ')[0].replace('\xa0', '').replace(',', '.').strip() for i in metrics if 'm²' in i), pd.NA)
-    return float(surface) if not pd.isna(surface) else surface
-
-def find_year(metrics: list) -> int:
-    """Extract construction year from metrics."""
-    years = [int(i) for i in metrics if re.search(r'\d{4}', i)]
-    return years[0] if len(years) == 1 else pd.NA
-
-def get_coordinates_nominatim(address: str, geolocator: Nominatim) -> tuple:
-    """Get geographical coordinates using Nominatim."""
-    try:
-        location = geolocator.geocode(address)
-        return (location.latitude, location.longitude) if location else (None, None)
-    except Exception as e:
-        print(f"Error geocoding address with Nominatim {address}: {e}")
-        return (None, None)
-
-def get_coordinates_google(address: str, api_key: str) -> tuple:
-    """Get geographical coordinates using Google Maps API."""
-    try:
-        url = f'https://maps.googleapis.com/maps/api/geocode/json?address={address}&key={api_key}'
-        response = requests.get(url).json()
-        if response['status'] == 'OK':
-            location = response['results'][0]['geometry']['location']
-            return location['lat'], location['lng']
-        return (None, None)
-    except Exception as e:
-        print(f"Error geocoding address with Google {address}: {e}")
-        return (None, None)
-
-def get_coordinates_openrouteservice(address: str, api_key: str) -> tuple:
-    """Get geographical coordinates using OpenRouteService API."""
-    try:
-        url = f'https://api.openrouteservice.org/geocode/search?api_key={api_key}&text={address}'
-        response = requests.get(url).json()
-        if response.get('features'):
-            location = response['features'][0]['geometry']['coordinates']
-            return location[1], location[0]
-        return (None, None)
-    except Exception as e:
-        print(f"Error geocoding address with OpenRouteService {address}: {e}")
-        return (None, None)
-
-def get_coordinates(row: pd.Series, geolocator: Nominatim, google_key: str, openrouteservice_key: str) -> pd.Series:
-    """Determine the coordinates of a listing."""
-    if pd.notna(row.get('latitude')) and pd.notna(row.get('longitude')):
-        return pd.Series((row['latitude'], row['longitude']))
-    coords = get_coordinates_nominatim(row['address'], geolocator)
-    if coords == (None, None):
-        coords = get_coordinates_google(row['address'], google_key)
-    if coords == (None, None):
-        coords = get_coordinates_openrouteservice(row['address'], openrouteservice_key)
-    return pd.Series(coords)
-
-def get_distance_and_time(row: pd.Series, api_key: str, origin: str) -> pd.Series:
-    """Calculate the driving distance and time from HEL to the listing."""
-    if pd.isna(row['latitude']) or pd.isna(row['longitude']):
-        return pd.Series([None, None])
-    if pd.notna(row.get('distance')) and pd.notna(row.get('duration')):
-        return pd.Series([row['distance'], row['duration']])
-    
-    try:
-        destination = f"{row['latitude']},{row['longitude']}"
-        url = f"https://maps.googleapis.com/maps/api/distancematrix/json?units=metric&origins={origin}&destinations={destination}&key={api_key}"
-        response = requests.get(url).json()
-        if response['status'] == 'OK':
-            element = response['rows'][0]['elements'][0]
-            if element['status'] == 'OK':
-                distance = element['distance']['text']
-                duration = element['duration']['text']
-                return pd.Series([distance, duration])
-        return pd.Series([None, None])
-    except Exception as e:
-        print(f"Error fetching distance and time for {row['latitude']}, {row['longitude']}: {e}")
-        return pd.Series([None, None])
-
-def process_listings(data: str, most_recent_date: datetime, google_key: str, openrouteservice_key: str) -> pd.DataFrame:
-    """Process listings to extract relevant information and calculate metrics."""
-    jsons = data.split('[\n')
-    etuovi_listings = eval(''.join(jsons[1][:-1].split("\n")))
-    listing_details = eval(''.join(jsons[2][:-2].split("\n")))
+def _clean_number(tokens: pd.Series) -> pd.Series:
+    """Convert Finnish formatted numbers ('85\xa0000', '37,5') to floats."""
+    return tokens.str.replace('\xa0', '', regex=False).str.replace(',', '.', regex=False).str.strip().astype(float)
+
+def _first_per_row(rows: np.ndarray, mask: np.ndarray, values: np.ndarray, n_rows: int, unique_only: bool = False) -> np.ndarray:
+    """Scatter the value of the first masked token of every row into a row-aligned array."""
+    result = np.full(n_rows, np.nan)
+    matched_rows, first = np.unique(rows[mask], return_index=True)
+    if unique_only:
+        # Keep only rows with exactly one matching token
+        single = np.bincount(rows[mask], minlength=n_rows)[matched_rows] == 1
+        matched_rows, first = matched_rows[single], first[single]
+    result[matched_rows] = values[mask][first]
+    return result
+
+def parse_metrics(metrics: pd.Series) -> pd.DataFrame:
+    """Extract price, surface and construction year from the metrics lists in a single vectorized pass."""
+    tokens = metrics.reset_index(drop=True).explode()
+    rows = tokens.index.to_numpy()
+    codes, uniques = pd.factorize(tokens.to_numpy())
+
+    # Tokens repeat heavily across listings, so each distinct token is classified and parsed only once
+    uniques = pd.Series(uniques, dtype=object).astype(str)
+    is_price = uniques.str.contains('€', regex=False)
+    is_surface = uniques.str.contains('m²', regex=False)
+    is_year = uniques.str.contains(YEAR_PATTERN)
+
+    token_values = {
+        "price": _clean_number(uniques[is_price].str.replace('€', '', regex=False)),
+        "surface": _clean_number(uniques[is_surface].str.split(' ').str[0]),
+        "year": uniques[is_year].astype(int).astype(float),
+    }
+    masks = {"price": is_price, "surface": is_surface, "year": is_year}
+
+    # Broadcast the per-token results back to the exploded tokens; missing tokens (code -1) hit the appended sentinel
+    columns = {}
+    for name, mask in masks.items():
+        token_mask = np.append(mask.to_numpy(), False)[codes]
+        values = np.append(token_values[name].reindex(uniques.index).to_numpy(), np.nan)[codes]
+        # A year is only trusted when exactly one token looks like one
+        columns[name] = _first_per_row(rows, token_mask, values, len(metrics), unique_only=(name == "year"))
+
+    return pd.DataFrame({
+        "price": columns["price"],
+        "surface": columns["surface"],
+        "year": pd.array(columns["year"], dtype='Int64'),
+    })
 
-    df_listings = pd.DataFrame(etuovi_listings)
-    df_details = pd.DataFrame(listing_details)
+def get_coordinates(df: pd.DataFrame, engine: GeocodingEngine) -> pd.DataFrame:
+    """Determine the coordinates of the listings that do not have any yet."""
+    coords_df = df[['latitude', 'longitude']].astype(float)
+    missing = coords_df['latitude'].isna() | coords_df['longitude'].isna()
+    coords = engine.geocode_many(df.loc[missing, 'address'])
+    located = pd.DataFrame([coords[address] for address in df.loc[missing, 'address']],
+                           index=coords_df.index[missing], columns=['latitude', 'longitude'], dtype=float)
+    return located.combine_first(coords_df).reindex(coords_df.index)[['latitude', 'longitude']]
+
+def fingerprint_listings(df: pd.DataFrame) -> pd.Series:
+    """Hash each raw crawl record (address, metrics, description, rooms, winterized)."""
+    records = df[FINGERPRINT_COLUMNS].astype(object).where(df[FINGERPRINT_COLUMNS].notna(), None).itertuples(index=False)
+    return pd.Series(
+        [hashlib.sha1(json.dumps(list(record), ensure_ascii=False).encode('utf-8')).hexdigest() for record in records],
+        index=df.index, dtype=object
+    )
 
-    new_df = df_listings.merge(df_details, on='url', how='left')
+def read_listings(listings: Iterable[dict], details: Iterable[dict]) -> pd.DataFrame:
+    """Join the raw result cards with their details and fingerprint every record."""
+    df_listings = pd.DataFrame.from_records(listings, columns=LISTING_COLUMNS)
+    df_details = pd.DataFrame.from_records(details, columns=DETAILS_COLUMNS).drop_duplicates('url')
 
-    new_df["price"] = new_df["metrics"].apply(find_price)
-    new_df["surface"] = new_df["metrics"].apply(find_surface)
-    new_df["year"] = new_df["metrics"].apply(find_year)
+    raw_df = df_listings.merge(df_details, on='url', how='left')
+    raw_df['fingerprint'] = fingerprint_listings(raw_df)
+    return raw_df
+
+def parse_listings(raw_df: pd.DataFrame) -> pd.DataFrame:
+    """Extract relevant information and calculate metrics from raw records."""
+    new_df = raw_df.join(parse_metrics(raw_df["metrics"]).set_axis(raw_df.index))
     new_df = new_df.drop(['metrics'], axis=1)
 
     new_df['description'] = new_df['description'].str.replace('Mökki tai huvila | ', '', regex=False)
@@ -125,65 +128,103 @@ def process_listings(data: str, most_recent_date: datetime, google_key: str, ope
 
     return new_df
 
-def merge_and_update_data(old_df: pd.DataFrame, new_df: pd.DataFrame, most_recent_date: datetime) -> pd.DataFrame:
-    """Merge old and new data and update columns."""
-    merged_df = new_df.merge(old_df, on='url', how='left', suffixes=('', '_old'))
-
-    merged_df['first_posting_date'] = merged_df.apply(
-        lambda row: row['first_posting_date'] if pd.notna(row['first_posting_date']) else most_recent_date,
-        axis=1
-    )
-
-    merged_df['last_posting_date'] = most_recent_date
-    merged_df['original_price'] = merged_df.apply(
-        lambda row: row['original_price'] if pd.notna(row['original_price']) else row['price'],
-        axis=1
-    )
-
-    return merged_df.drop(columns=[col for col in merged_df.columns if col.endswith('_old')])
-
-def save_to_csv(final_df: pd.DataFrame, final_path: str):
-    """Save the final DataFrame to a CSV file."""
-    final_df.to_csv(final_path, index=False)
+def process_listings(listings: Iterable[dict], details: Iterable[dict]) -> pd.DataFrame:
+    """Process listings to extract relevant information and calculate metrics."""
+    return parse_listings(read_listings(listings, details))
+
+def split_changes(raw_df: pd.DataFrame, history: pd.DataFrame) -> pd.Series:
+    """Label each raw record 'new', 'changed' or 'unchanged' by comparing its fingerprint with the history."""
+    known = history.reindex(raw_df['url'])
+    status = np.where(known['fingerprint'].to_numpy() == raw_df['fingerprint'].to_numpy(), 'unchanged', 'changed')
+    status[~raw_df['url'].isin(history.index).to_numpy()] = 'new'
+    return pd.Series(status, index=raw_df.index)
+
+def reusable_rows(raw_df: pd.DataFrame, status: pd.Series, previous_df: pd.DataFrame) -> pd.Series:
+    """Unchanged records whose previous row is complete, so it can be carried over as is."""
+    previous = previous_df.drop_duplicates('url').set_index('url').reindex(raw_df['url'])
+    # Listings without coordinates or with an estimated route get another enrichment attempt
+    complete = previous['latitude'].notna() & previous['route_estimated'].ne(True)
+    return (status == 'unchanged') & complete.to_numpy()
+
+def merge_and_update_data(history: pd.DataFrame, new_df: pd.DataFrame, most_recent_date: datetime) -> pd.DataFrame:
+    """Merge new listings with the listing history index and update columns."""
+    merged_df = new_df.set_index('url', drop=False)
+    known = history.reindex(merged_df.index)
+
+    # Relisted properties keep their original posting date, price, location and route
+    for column in ['original_price', 'latitude', 'longitude', 'distance', 'duration', 'route_estimated', 'property_id']:
+        merged_df[column] = known[column]
+    merged_df['first_posting_date'] = known['first_posting_date'].fillna(pd.Timestamp(most_recent_date))
+    merged_df['last_posting_date'] = pd.Timestamp(most_recent_date)
+    merged_df['original_price'] = merged_df['original_price'].fillna(merged_df['price'])
+
+    return merged_df.reset_index(drop=True).reindex(columns=OUTPUT_COLUMNS)
+
+def concat_rows(frames: list) -> pd.DataFrame:
+    """Concatenate the frames holding rows; an empty one would still take part in the result dtypes (deprecated by pandas)."""
+    return pd.concat([frame for frame in frames if not frame.empty] or frames[:1])
 
 def transform_data():
     env_vars = load_environment_variables()
-    geolocator = Nominatim(user_agent="kesa_mokki_project")
+    geocode_cache = GeocodeCache()
+    geocoding_engine = GeocodingEngine(env_vars["google_key"], env_vars["openrouteservice_key"], geocode_cache)
     final_df = None
 
-    # Get the most recent data files
-    csv_files = sorted(glob(os.path.join('data/cabins', 'etuovi_data_*.csv')), key=lambda x: os.path.basename(x).split('_')[-1].split('.')[0], reverse=True)
-    json_files = sorted(glob(os.path.join('data/cabins', 'etuovi_data_*.json')), key=lambda x: os.path.basename(x).split('_')[-1].split('.')[0], reverse=True)
+    # Get the most recent snapshot
+    most_recent_snapshot = find_snapshots()[0]
 
-    # Extract the timestamp from the most recent file's filename
-    most_recent_date = datetime.strptime(os.path.basename(json_files[0]).split('_')[-1].split('.')[0], '%Y%m%d-%H%M%S').date()
+    # Extract the timestamp from the most recent snapshot
+    most_recent_date = datetime.strptime(most_recent_snapshot, '%Y%m%d-%H%M%S').date()
 
-    # Load previous week data
-    old_df = pd.read_csv(csv_files[0])
+    # Load the history of every listing seen so far and the previous processed snapshot
+    history = load_history()
+    previous_df = load_snapshot('latest')
 
-    # Load and process new data
-    with open(json_files[0], 'r') as data_raw:
-        data = data_raw.read()
+    # Stream the new data and find the listings that changed since they were last seen
+    raw_df = read_listings(*read_snapshot(most_recent_snapshot))
+    status = split_changes(raw_df, history)
+    reuse = reusable_rows(raw_df, status, previous_df)
+    counts = status.value_counts()
+    logging.info("%d new, %d changed, %d unchanged listings; %d to process",
+                 counts.get('new', 0), counts.get('changed', 0), counts.get('unchanged', 0), (~reuse).sum())
 
-    new_df = process_listings(data, most_recent_date, env_vars["google_key"], env_vars["openrouteservice_key"])
+    # Unchanged listings are carried over from the previous snapshot with only their last posting date bumped
+    unchanged_df = previous_df.drop_duplicates('url').set_index('url', drop=False).loc[raw_df.loc[reuse, 'url']]
+    unchanged_df = unchanged_df.set_axis(raw_df.index[reuse]).reindex(columns=OUTPUT_COLUMNS)
+    unchanged_df['last_posting_date'] = pd.Timestamp(most_recent_date)
 
-    # Merge with old data and update
-    final_df = merge_and_update_data(old_df, new_df, most_recent_date)
+    # Process the delta and merge it with the listing history
+    delta_df = raw_df[~reuse]
+    delta_df = merge_and_update_data(history, parse_listings(delta_df), most_recent_date).set_axis(delta_df.index)
 
-    # Obtain geographical data from new listings
-    final_df[['latitude', 'longitude']] = final_df.apply(
-        lambda row: get_coordinates(row, geolocator, env_vars["google_key"], env_vars["openrouteservice_key"]), axis=1
-    )
-
-    # Obtain driving distance and time
-    final_df[['distance', 'duration']] = final_df.apply(
-        lambda row: get_distance_and_time(row, env_vars["google_key"], env_vars["origin"]), axis=1
-    )
+    # Group listings of the same property, across URL schemes and relistings, so they share one location and route
+    property_ids = deduplicate(concat_rows([unchanged_df, delta_df]), history)
+    unchanged_df['property_id'] = property_ids.loc[unchanged_df.index]
+    delta_df['property_id'] = property_ids.loc[delta_df.index]
+    delta_df[ROUTE_COLUMNS] = share_property_routes(delta_df, history)
 
-    # Save final data to CSV
-    final_path = json_files[0].replace('.json', '.csv')
-    save_to_csv(final_df, final_path)
-    logging.info("New listings propertly saves as : %d", final_path)
+    # Obtain geographical data from new listings
+    delta_df[['latitude', 'longitude']] = get_coordinates(delta_df, geocoding_engine)
+    geocoding_engine.close()
+    geocode_cache.log_stats()
+
+    # Obtain driving distance and time, giving previously estimated routes another chance with Google
+    delta_df.loc[delta_df['route_estimated'].fillna(False).astype(bool), ['distance', 'duration']] = None
+    delta_df[['distance', 'duration']] = get_distances_and_times(delta_df, env_vars["google_key"], env_vars["origin"])
+
+    # Listings Google could not route get an offline estimate from the measured routes
+    delta_df[['distance', 'duration', 'route_estimated']] = estimate_missing_routes(delta_df)
+
+    final_df = concat_rows([unchanged_df, delta_df]).sort_index().reset_index(drop=True)
+    final_df[['distance_km', 'duration_min']] = route_metrics(final_df)
+    final_df['region'] = assign_regions(final_df)
+    final_df[HEALTHCARE_COLUMNS] = healthcare_features(final_df)
+
+    # Save final data to the snapshot store
+    final_path = write_snapshot(final_df, most_recent_snapshot)
+    append_price_events(diff_prices(history, final_df), most_recent_snapshot)
+    save_history(update_history(history, final_df))
+    logging.info("New listings properly saved as: %s", final_path)
 
 if __name__ == "__main__":
     transform_data()
@@ -1,10 +1,19 @@
 import os
+import io
+import time
 import logging
-from glob import glob
+import sqlite3
+import argparse
 from dotenv import load_dotenv
 
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
+
+from src.data_pipeline.snapshot_store import load_snapshot
+from src.data_pipeline.regions import assign_regions
+from src.data_pipeline.healthcare_features import HEALTHCARE_COLUMNS, healthcare_features
+from src.data_pipeline.price_events import PRICE_EVENTS_DDL, load_price_events
+from src.data_pipeline.dashboard_aggregates import refresh_aggregates
 
 # Load environment variables from the .env file (if present)
 load_dotenv()
@@ -16,76 +25,244 @@ POSTGRES_SERVER = os.getenv('PostgreSQL_SERVER')
 POSTGRES_PORT = os.getenv('PostgreSQL_PORT')
 POSTGRES_DATABASE = os.getenv('PostgreSQL_DATABASE')
 
-# Define the folder path
-FOLDER_PATH = r'data\cabins'
+# Columns of cabins_main; url is the conflict key
+LOAD_COLUMNS = [
+    'address', 'url', 'description', 'rooms', 'winterized', 'price', 'surface', 'year', 'original_price',
+    'latitude', 'longitude', 'distance', 'duration', 'route_estimated', 'distance_km', 'duration_min', 'first_posting_date', 'last_posting_date',
+    'region', 'nearest_hospital', 'hospital_km', 'hospital_count', 'nearest_health_center', 'health_center_km',
+    'health_center_count',
+]
+UPDATE_COLUMNS = [column for column in LOAD_COLUMNS if column != 'url']
+# Every live listing is reposted weekly; only a change in these columns makes it an update
+CONTENT_COLUMNS = [column for column in UPDATE_COLUMNS if column != 'last_posting_date']
+STAGING_TABLE = 'cabins_staging'
+PRICE_EVENTS_COLUMNS = ['url', 'event_date', 'price', 'previous_price', 'change', 'event_type']
+PRICE_EVENTS_STAGING_TABLE = 'price_events_staging'
+
+# Numeric route columns, parsed once at ingest; rows loaded before they existed are parsed here in SQL once
+ROUTE_METRICS_MIGRATION = [
+    "ALTER TABLE cabins_main ADD COLUMN IF NOT EXISTS distance_km DOUBLE PRECISION, ADD COLUMN IF NOT EXISTS duration_min DOUBLE PRECISION",
+    r"""
+    UPDATE cabins_main SET
+        distance_km = CASE
+            WHEN distance ~ '[\d,.]+\s*km' THEN replace(substring(distance from '([\d,.]+)\s*km'), ',', '')::double precision
+            WHEN distance ~ '\d+\s*m\M' THEN substring(distance from '(\d+)\s*m')::double precision / 1000
+        END,
+        duration_min = CASE WHEN duration ~ '\d+\s*(day|hour|min)' THEN
+            coalesce(substring(duration from '(\d+)\s*day')::int, 0) * 1440
+            + coalesce(substring(duration from '(\d+)\s*hour')::int, 0) * 60
+            + coalesce(substring(duration from '(\d+)\s*min')::int, 0)
+        END
+    WHERE (distance_km IS NULL AND distance IS NOT NULL) OR (duration_min IS NULL AND duration IS NOT NULL)
+    """,
+]
+# Routes filled by the offline drive time estimator rather than measured by Google
+ROUTE_ESTIMATED_MIGRATION = ["ALTER TABLE cabins_main ADD COLUMN IF NOT EXISTS route_estimated BOOLEAN"]
+# Region of each listing, from the same polygons the dashboard draws
+REGION_MIGRATION = ["ALTER TABLE cabins_main ADD COLUMN IF NOT EXISTS region TEXT"]
+# Nearest-healthcare columns; listings no longer posted are never staged again, backfill_features fills their rows
+HEALTHCARE_MIGRATION = [
+    """
+    ALTER TABLE cabins_main
+        ADD COLUMN IF NOT EXISTS nearest_hospital TEXT, ADD COLUMN IF NOT EXISTS hospital_km DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS hospital_count SMALLINT, ADD COLUMN IF NOT EXISTS nearest_health_center TEXT,
+        ADD COLUMN IF NOT EXISTS health_center_km DOUBLE PRECISION, ADD COLUMN IF NOT EXISTS health_center_count SMALLINT
+    """,
+    "CREATE INDEX IF NOT EXISTS cabins_main_hospital_km_idx ON cabins_main (hospital_km)",
+]
+
+
+class PostgresBackend:
+    """Streams rows with COPY into unlogged staging tables next to the tables they are loaded into."""
+    distinct = 'IS DISTINCT FROM'
+    migrations = ROUTE_METRICS_MIGRATION + ROUTE_ESTIMATED_MIGRATION + REGION_MIGRATION + HEALTHCARE_MIGRATION
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.conn = engine.raw_connection()
+
+    def stage(self, df: pd.DataFrame, columns: list = LOAD_COLUMNS, table: str = STAGING_TABLE, like: str = 'cabins_main'):
+        cursor = self.conn.cursor()
+        # Recreated on every run so that it follows the columns the migrations add to the target table
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(f"CREATE UNLOGGED TABLE {table} (LIKE {like} INCLUDING DEFAULTS)")
+        buffer = io.StringIO()
+        df.to_csv(buffer, columns=columns, index=False, header=False)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+    def execute(self, sql: str) -> tuple:
+        cursor = self.conn.cursor()
+        cursor.execute(sql)
+        return cursor.fetchone() if cursor.description else None
+
+    def read_table(self, name: str) -> pd.DataFrame:
+        return pd.read_sql_table(name, self.engine)
+
+    def read_query(self, sql: str) -> pd.DataFrame:
+        return pd.read_sql(sql, self.engine)
+
+    def write_table(self, name: str, df: pd.DataFrame):
+        df.to_sql(name, self.engine, if_exists='replace', index=False)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
 
-def define_new_file():
-    # Get the list of CSV files sorted by the date in the filename
-    csv_files = sorted(glob(os.path.join(FOLDER_PATH, 'etuovi_data_*.csv')), key=lambda x: os.path.basename(x).split('_')[-1].split('.')[0], reverse=True)
-    return csv_files[0]
+class SQLiteBackend(PostgresBackend):
+    """Stand-in for PostgreSQL, to run the loader without a server."""
+    distinct = 'IS NOT'
+    # cabins_main is created with every column of LOAD_COLUMNS
+    migrations = []
 
-def update_data():
-    new_file = define_new_file()
-    new_data = pd.read_csv(new_file)
+    def __init__(self, path: str = ':memory:'):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS cabins_main (
+                {', '.join(f'{column} TEXT PRIMARY KEY' if column == 'url' else column for column in LOAD_COLUMNS)}
+            )
+        """)
 
-    new_data['winterized'] = new_data['winterized'].apply(lambda x: True if x == 'YES' else False)
+    def stage(self, df: pd.DataFrame, columns: list = LOAD_COLUMNS, table: str = STAGING_TABLE, like: str = 'cabins_main'):
+        self.conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+        self.conn.execute(f"CREATE TEMP TABLE {table} AS SELECT * FROM {like} WHERE 0")
+        rows = df[columns].astype(object).where(df[columns].notna(), None)
+        rows = rows.apply(lambda column: column.map(lambda value: value.isoformat() if hasattr(value, 'isoformat') else value))
+        self.conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                              rows.itertuples(index=False))
 
+    def read_table(self, name: str) -> pd.DataFrame:
+        return pd.read_sql(f"SELECT * FROM {name}", self.conn)
+
+    def read_query(self, sql: str) -> pd.DataFrame:
+        return pd.read_sql(sql, self.conn)
+
+    def write_table(self, name: str, df: pd.DataFrame):
+        df.to_sql(name, self.conn, if_exists='replace', index=False)
+
+
+def prepare_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert a snapshot to the cabins_main column types."""
+    df = df.copy()
+    df['winterized'] = df['winterized'] == 'YES'
     # Convert date columns from text to datetime
-    new_data['first_posting_date'] = pd.to_datetime(new_data['first_posting_date']).dt.date
-    new_data['last_posting_date'] = pd.to_datetime(new_data['last_posting_date']).dt.date
+    df['first_posting_date'] = pd.to_datetime(df['first_posting_date']).dt.date
+    df['last_posting_date'] = pd.to_datetime(df['last_posting_date']).dt.date
+    return df
+
+def load_delta(df: pd.DataFrame, backend) -> dict:
+    """Stage every row, insert new listings, update those whose content changed and move the others' last_posting_date."""
+    start = time.perf_counter()
+    for statement in backend.migrations:
+        backend.execute(statement)
+    backend.stage(df)
+    stage_time = time.perf_counter() - start
+
+    staged = f"({', '.join(f's.{column}' for column in CONTENT_COLUMNS)})"
+    current = f"({', '.join(f'm.{column}' for column in CONTENT_COLUMNS)})"
+    inserted, updated, unchanged, reposted = backend.execute(f"""
+        SELECT
+            COUNT(*) FILTER (WHERE m.url IS NULL),
+            COUNT(*) FILTER (WHERE m.url IS NOT NULL AND {staged} {backend.distinct} {current}),
+            COUNT(*) FILTER (WHERE m.url IS NOT NULL AND NOT {staged} {backend.distinct} {current}),
+            COUNT(*) FILTER (WHERE m.url IS NOT NULL AND NOT {staged} {backend.distinct} {current}
+                             AND s.last_posting_date {backend.distinct} m.last_posting_date)
+        FROM {STAGING_TABLE} s LEFT JOIN cabins_main m ON m.url = s.url
+    """)
+    backend.execute(f"""
+        INSERT INTO cabins_main ({', '.join(LOAD_COLUMNS)})
+        SELECT {', '.join(LOAD_COLUMNS)} FROM {STAGING_TABLE} WHERE true
+        ON CONFLICT (url) DO UPDATE SET
+            {', '.join(f'{column} = EXCLUDED.{column}' for column in UPDATE_COLUMNS)}
+        WHERE ({', '.join(f'cabins_main.{column}' for column in CONTENT_COLUMNS)})
+            {backend.distinct} ({', '.join(f'EXCLUDED.{column}' for column in CONTENT_COLUMNS)})
+    """)
+    # Unchanged listings still in the snapshot only move their last_posting_date, in one statement
+    backend.execute(f"""
+        UPDATE cabins_main SET last_posting_date = s.last_posting_date
+        FROM {STAGING_TABLE} s
+        WHERE cabins_main.url = s.url AND cabins_main.last_posting_date {backend.distinct} s.last_posting_date
+    """)
+    backend.commit()
+    upsert_time = time.perf_counter() - start - stage_time
+
+    logging.info(f"Successfully uploaded data: {inserted} new rows, {updated} updated rows, {unchanged} unchanged rows "
+                 f"({reposted} reposted) (staging {stage_time:.2f}s, upsert {upsert_time:.2f}s).")
+    return {"inserted": inserted, "updated": updated, "unchanged": unchanged, "reposted": reposted,
+            "stage_seconds": stage_time, "upsert_seconds": upsert_time}
+
+def backfill_features(backend) -> int:
+    """Compute the region and healthcare columns of located rows loaded before these columns existed."""
+    missing = backend.read_query("""
+        SELECT url, latitude, longitude FROM cabins_main
+        WHERE hospital_km IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL
+    """)
+    if missing.empty:
+        return 0
+    missing = missing.astype({'latitude': float, 'longitude': float})
+    missing['region'] = assign_regions(missing)
+    missing[HEALTHCARE_COLUMNS] = healthcare_features(missing)
+
+    columns = ['region'] + HEALTHCARE_COLUMNS
+    backend.stage(missing, ['url'] + columns)
+    backend.execute(f"""
+        UPDATE cabins_main SET {', '.join(f'{column} = s.{column}' for column in columns)}
+        FROM {STAGING_TABLE} s
+        WHERE cabins_main.url = s.url
+    """)
+    backend.commit()
+    logging.info(f"Backfilled the region and healthcare columns of {len(missing)} rows.")
+    return len(missing)
+
+def update_data(backend=None) -> dict:
+    new_data = prepare_rows(load_snapshot('latest'))
 
     # Database connection
-    engine = create_engine(f'postgresql://{POSTGRES_USER}:{POSTGRES_PSW}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DATABASE}')
-    
-    # Insert new data into temporary table
-    new_data.to_sql('cabins_temp', engine, if_exists='replace', index=False)
-    
-    # Upsert data into main table and get counts
-    with engine.connect() as conn:
-        try:
-            result = conn.execute(text("""
-                WITH upserted AS (
-                    INSERT INTO cabins_main (
-                        address, url, description, rooms, winterized, price, surface, year, original_price,
-                        latitude, longitude, distance, duration, first_posting_date, last_posting_date
-                    )
-                    SELECT 
-                        address, url, description, rooms, winterized, price, surface, year, original_price,
-                        latitude, longitude, distance, duration, first_posting_date, last_posting_date
-                    FROM cabins_temp
-                    ON CONFLICT (url) DO UPDATE SET
-                        address = EXCLUDED.address,
-                        description = EXCLUDED.description,
-                        rooms = EXCLUDED.rooms,
-                        winterized = EXCLUDED.winterized,
-                        price = EXCLUDED.price,
-                        surface = EXCLUDED.surface,
-                        year = EXCLUDED.year,
-                        original_price = EXCLUDED.original_price,
-                        latitude = EXCLUDED.latitude,
-                        longitude = EXCLUDED.longitude,
-                        distance = EXCLUDED.distance,
-                        duration = EXCLUDED.duration,
-                        first_posting_date = EXCLUDED.first_posting_date,
-                        last_posting_date = EXCLUDED.last_posting_date
-                    RETURNING 
-                        (xmax = 0) AS inserted -- true if row was inserted, false if updated
-                )
-                SELECT 
-                    COUNT(*) FILTER (WHERE inserted) AS new_rows,
-                    COUNT(*) FILTER (WHERE NOT inserted) AS updated_rows
-                FROM upserted;
-            """))
-
-            counts = result.fetchone()
-            new_rows = counts['new_rows']
-            updated_rows = counts['updated_rows']
-
-            logging.info(f"Successfully uploaded data: {new_rows} new rows, {updated_rows} updated rows.")
-        
-        except Exception as e:
-            logging.error(f"Error during execution: {e}")
+    if backend is None:
+        engine = create_engine(f'postgresql://{POSTGRES_USER}:{POSTGRES_PSW}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DATABASE}')
+        backend = PostgresBackend(engine)
+
+    try:
+        counts = load_delta(new_data, backend)
+        counts['backfilled'] = backfill_features(backend)
+        counts['price_events'] = load_price_events_table(backend, new_data['last_posting_date'].max())
+        # The dashboard reads these small tables instead of the whole cabins_main
+        refresh_aggregates(backend)
+    except Exception as e:
+        logging.error(f"Error during execution: {e}")
+        return None
+    finally:
+        backend.close()
+    return counts
+
+def load_price_events_table(backend, snapshot_date) -> int:
+    """Append the price events of a snapshot to the price_events table; events already loaded are left untouched."""
+    events = load_price_events(since=snapshot_date)
+    events['event_date'] = events['event_date'].dt.date
+    for statement in PRICE_EVENTS_DDL:
+        backend.execute(statement)
+    backend.stage(events, PRICE_EVENTS_COLUMNS, PRICE_EVENTS_STAGING_TABLE, like='price_events')
+
+    appended, = backend.execute(f"""
+        SELECT COUNT(*) FROM {PRICE_EVENTS_STAGING_TABLE} s
+        WHERE NOT EXISTS (SELECT 1 FROM price_events p WHERE p.url = s.url AND p.event_date = s.event_date)
+    """)
+    backend.execute(f"""
+        INSERT INTO price_events ({', '.join(PRICE_EVENTS_COLUMNS)})
+        SELECT {', '.join(PRICE_EVENTS_COLUMNS)} FROM {PRICE_EVENTS_STAGING_TABLE} WHERE true
+        ON CONFLICT (url, event_date) DO NOTHING
+    """)
+    backend.commit()
+    logging.info(f"Appended {appended} price events.")
+    return appended
 
 # If running this file directly
 if __name__ == "__main__":
-    update_data()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Load the latest snapshot into cabins_main.")
+    parser.add_argument('--sqlite', metavar='PATH', help="load into a SQLite database instead of PostgreSQL")
+    args = parser.parse_args()
+    update_data(SQLiteBackend(args.sqlite) if args.sqlite else None)
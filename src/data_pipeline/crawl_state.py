@@ -0,0 +1,95 @@
+import os
+import json
+import sqlite3
+import hashlib
+from datetime import datetime, timedelta
+
+# Configuration and Constants
+STATE_DB_PATH = os.path.abspath("data/cache/crawl_state.sqlite")
+# Listings are refetched at least this often even when their result card is unchanged
+MAX_STATE_AGE_DAYS = 28
+# Result card tokens that change without the listing itself changing ("Uusi" badge, "24 h")
+VOLATILE_METRICS = {'Uusi', 'h', ''}
+
+
+def listing_card_hash(listing: dict) -> str:
+    """Hash the stable fields of a result card (address, description and metrics)."""
+    metrics = [m.strip() for m in listing.get('metrics') or [] if m.strip() not in VOLATILE_METRICS and not m.strip().isdigit()]
+    payload = json.dumps([listing.get('address'), listing.get('description'), metrics], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def details_hash(details: dict) -> str:
+    """Hash the fields extracted from a listing page."""
+    payload = json.dumps([details.get('rooms'), details.get('winterized')], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class CrawlStateStore:
+    """Persistent per-URL state of the listing detail crawl."""
+
+    def __init__(self, path: str = STATE_DB_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS listing_state (
+                url TEXT PRIMARY KEY,
+                last_fetched TEXT NOT NULL,
+                card_hash TEXT,
+                content_hash TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                rooms TEXT,
+                winterized TEXT
+            )
+        """)
+        self.conn.commit()
+
+    def get_many(self, urls: list) -> dict:
+        """Return the stored state of the given URLs, keyed by URL."""
+        states = {}
+        urls = list(urls)
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(f"SELECT * FROM listing_state WHERE url IN ({placeholders})", chunk)
+            states.update({row['url']: dict(row) for row in rows})
+        return states
+
+    def is_fresh(self, state: dict, card_hash: str, max_age_days: int = MAX_STATE_AGE_DAYS) -> bool:
+        """Whether a listing can be skipped: same result card and fetched recently."""
+        if not state or state['card_hash'] != card_hash:
+            return False
+        last_fetched = datetime.fromisoformat(state['last_fetched'])
+        return datetime.now() - last_fetched < timedelta(days=max_age_days)
+
+    def record_fetch(self, url: str, details: dict, card_hash: str = None, etag: str = None, last_modified: str = None):
+        """Store the outcome of a full page fetch."""
+        self.conn.execute("""
+            INSERT INTO listing_state (url, last_fetched, card_hash, content_hash, etag, last_modified, rooms, winterized)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET
+                last_fetched = excluded.last_fetched,
+                card_hash = excluded.card_hash,
+                content_hash = excluded.content_hash,
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                rooms = excluded.rooms,
+                winterized = excluded.winterized
+        """, (url, datetime.now().isoformat(), card_hash, details_hash(details), etag, last_modified,
+              details.get('rooms'), details.get('winterized')))
+
+    def record_not_modified(self, url: str, card_hash: str = None):
+        """Refresh the fetch time of a listing the server reported as unchanged."""
+        self.conn.execute(
+            "UPDATE listing_state SET last_fetched = ?, card_hash = COALESCE(?, card_hash) WHERE url = ?",
+            (datetime.now().isoformat(), card_hash, url)
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
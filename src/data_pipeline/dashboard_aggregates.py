@@ -0,0 +1,139 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.dashboard_artifacts import DASHBOARD_ARTIFACTS_PATH, build_artifacts, write_artifacts
+from src.data_pipeline.map_aggregation import DEFAULT_ZOOM, ZOOM_CELL_SIZES, grid_bins
+
+# Configuration and Constants
+HISTOGRAM_BINS = {"price": 60, "surface": 30}
+
+
+def clean_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Drop the listings unfit for the dashboard; every check looks at one row only."""
+    keep = (
+        # Rows without distance are most likely on an island
+        df['distance'].notna()
+        & df['original_price'].notna()
+        # An original_price or price under 1000 is a missing price
+        & ~((df['original_price'] < 1000) | (df['price'] < 1000))
+        # Without surface nor number of rooms there is nothing to compare
+        & ~(df['rooms'].isna() & df['surface'].isna())
+        & ~(df['surface'] >= 250)
+    )
+    return df[keep].copy()
+
+def price_bounds(df: pd.DataFrame) -> tuple:
+    """Prices below the 5th or above the 95th percentile are outliers."""
+    return df['price'].quantile(0.05), df['price'].quantile(0.95)
+
+def impute_rooms(rooms: pd.Series, surface: pd.Series) -> pd.Series:
+    """Fill missing room counts with the room count whose average surface is closest to the listing's surface.
+
+    Ties go to the room count listed first, as with idxmin.
+    """
+    average_surface = surface.groupby(rooms).mean().dropna()
+    missing = rooms.isna().to_numpy()
+    if not missing.any() or average_surface.empty:
+        return rooms
+
+    # Stable sort: among equal means the first room count in index order comes first
+    order = np.argsort(average_surface.to_numpy(), kind='stable')
+    means, labels = average_surface.to_numpy()[order], average_surface.index.to_numpy()[order]
+    first_equal = np.searchsorted(means, means, side='left')
+    target = surface.to_numpy(dtype=float)[missing]
+
+    # The nearest mean is one of the two sorted means around the surface
+    right = first_equal[np.clip(np.searchsorted(means, target), 0, len(means) - 1)]
+    left = first_equal[np.clip(right - 1, 0, len(means) - 1)]
+    left_gap, right_gap = np.abs(means[left] - target), np.abs(means[right] - target)
+    # Equally close means: idxmin keeps the first room count in index order
+    choose_right = (right_gap < left_gap) | ((right_gap == left_gap) & (order[right] < order[left]))
+    imputed = np.where(np.isnan(target), np.nan, labels[np.where(choose_right, right, left)])
+
+    filled = rooms.astype(float).to_numpy().copy()
+    filled[missing] = imputed
+    return pd.Series(filled, index=rooms.index, name=rooms.name)
+
+def clean_listings(df: pd.DataFrame) -> pd.DataFrame:
+    """Filter out listings unfit for the dashboard, impute missing room counts and drop price outliers."""
+    return finish_listings(clean_rows(df))
+
+def finish_listings(rows: pd.DataFrame) -> pd.DataFrame:
+    """The steps of clean_listings that depend on every row (room means, price quantiles), on rows clean_rows kept."""
+    df = rows.copy()
+    df['rooms'] = impute_rooms(df['rooms'], df['surface'])
+
+    # Remove outliers
+    lower_bound, upper_bound = price_bounds(df)
+    return df[df['price'].between(lower_bound, upper_bound)]
+
+def histogram_bins(df: pd.DataFrame) -> pd.DataFrame:
+    """Equal-width bins of price and surface, and one bin per room count."""
+    frames = []
+    for metric, n_bins in HISTOGRAM_BINS.items():
+        counts, edges = np.histogram(df[metric].dropna(), bins=n_bins)
+        frames.append(pd.DataFrame({"metric": metric, "bin_start": edges[:-1], "bin_end": edges[1:], "count": counts}))
+    rooms = df['rooms'].dropna().astype(float).value_counts().sort_index()
+    frames.append(pd.DataFrame({"metric": 'rooms', "bin_start": rooms.index - 0.5, "bin_end": rooms.index + 0.5, "count": rooms.to_numpy()}))
+    return pd.concat(frames, ignore_index=True)
+
+def headline_metrics(df: pd.DataFrame) -> dict:
+    """Number of listings and their median price, surface and year of construction."""
+    return {
+        "listings": len(df),
+        "median_price": df['price'].median(),
+        "median_surface": df['surface'].median(),
+        "median_year": df['year'].median(),
+    }
+
+def winterized_shares(df: pd.DataFrame) -> pd.DataFrame:
+    winterized = df['winterized'].value_counts(normalize=True).reset_index()
+    winterized.columns = ['winterized', 'proportion']
+    return winterized
+
+def build_aggregates(df: pd.DataFrame) -> dict:
+    """Dashboard tables computed from every listing in cabins_main."""
+    rows = clean_rows(df)
+    filtered_df = finish_listings(rows)
+    lower_bound, upper_bound = price_bounds(rows)
+
+    headline = pd.DataFrame([{**headline_metrics(filtered_df), "price_lower_bound": lower_bound, "price_upper_bound": upper_bound}])
+    winterized = winterized_shares(filtered_df)
+
+    # Regions as tagged by the pipeline (regions.assign_regions): the unfiltered choropleth is drawn from this table
+    region_stats = (filtered_df.groupby('region')
+                    .agg(listings=('url', 'size'), median_price=('price', 'median'),
+                         median_surface=('surface', 'median'), median_duration_min=('duration_min', 'median'))
+                    .reset_index())
+
+    return {
+        "dash_headline": headline,
+        "dash_histogram": histogram_bins(filtered_df),
+        "dash_winterized": winterized,
+        "dash_region_stats": region_stats,
+        "dash_map_grid": grid_bins(filtered_df, DEFAULT_ZOOM),
+    }
+
+def refresh_aggregates(backend, artifacts_path: str = DASHBOARD_ARTIFACTS_PATH) -> dict:
+    """Recompute the dashboard tables from cabins_main and replace them in the database.
+
+    The default view of the dashboard (headline metrics and figures) is also
+    written to artifacts_path, for the app to draw without touching the database.
+    The app builds the same view from the tables when that file is missing.
+    """
+    listings = backend.read_table('cabins_main')
+    aggregates = build_aggregates(listings)
+    for name, table in aggregates.items():
+        backend.write_table(name, table)
+    backend.commit()
+    logging.info("Refreshed dashboard tables: %s", {name: len(table) for name, table in aggregates.items()})
+
+    write_artifacts(artifacts_from_tables(aggregates), artifacts_path)
+    return aggregates
+
+def artifacts_from_tables(tables: dict) -> dict:
+    """The dashboard's default view from the dash_* tables."""
+    return build_artifacts(tables['dash_headline'].iloc[0], tables['dash_histogram'], tables['dash_winterized'],
+                           tables['dash_map_grid'], DEFAULT_ZOOM, ZOOM_CELL_SIZES)
@@ -0,0 +1,95 @@
+import os
+import json
+import math
+import logging
+from datetime import datetime, timezone
+
+# Kept free of pandas and plotly: the app imports this module before anything else is loaded
+
+# Configuration and Constants
+DASHBOARD_ARTIFACTS_PATH = 'data/dashboard/artifacts.json'
+HEADLINE_KEYS = ['listings', 'median_price', 'median_surface', 'median_year']
+# The dashboard palette, as a plotly template
+FIGURE_TEMPLATE = {"layout": {
+    "title": {"font": {"color": '#000000'}},
+    "font": {"color": '#000000', "family": 'Roboto'},
+    "colorway": ['#004d39', '#2a9d90', '#6abea6', '#b0c2a8', '#eee3dd'],
+}}
+# plotly's sequential Darkmint scale
+DARKMINT = ['#d2fbd4', '#a5dbc2', '#7bbcb0', '#559c9e', '#3a7c89', '#235d72', '#123f5a']
+MAP_LAYOUT = {"width": 800, "height": 800, "title": {"text": "Properties with Driving Duration to HEL Airport"},
+              "coloraxis": {"colorscale": [[i / (len(DARKMINT) - 1), color] for i, color in enumerate(DARKMINT)],
+                            "colorbar": {"title": {"text": "Duration (mins)"}}}}
+MAP_CENTER = {"lat": 65.5, "lon": 27}
+MAP_STYLE = 'carto-positron'
+MAP_MARKER_SIZE_MAX = 20
+HISTOGRAM_TITLES = {"price": "Distribution of Price", "surface": "Distribution of Surface",
+                    "rooms": "Distribution of Number of Rooms"}
+
+
+def _values(column) -> list:
+    """A column as JSON values, missing ones as null."""
+    return [None if isinstance(value, float) and math.isnan(value) else value for value in column.tolist()]
+
+def histogram_figure(bins, metric: str) -> dict:
+    """Bar chart of the pre-computed bins of a metric (dash_histogram rows)."""
+    bins = bins[bins['metric'] == metric]
+    return {
+        "data": [{"type": 'bar', "x": _values((bins['bin_start'] + bins['bin_end']) / 2), "y": _values(bins['count']),
+                  "width": _values(bins['bin_end'] - bins['bin_start']),
+                  "hovertemplate": f"{metric}=%{{x}}<br>count=%{{y}}<extra></extra>"}],
+        "layout": {"template": FIGURE_TEMPLATE, "title": {"text": HISTOGRAM_TITLES[metric]}, "bargap": 0,
+                   "xaxis": {"title": {"text": metric}}, "yaxis": {"title": {"text": 'count'}}},
+    }
+
+def winterized_figure(winterized) -> dict:
+    """Pie chart of the share of winterized listings (dash_winterized rows)."""
+    return {
+        "data": [{"type": 'pie', "labels": [str(value) for value in winterized['winterized'].tolist()],
+                  "values": _values(winterized['proportion']),
+                  "hovertemplate": "Property Status=%{label}<br>Proportion=%{value}<extra></extra>"}],
+        "layout": {"template": FIGURE_TEMPLATE, "title": {"text": "Proportion of Winterized Properties"}},
+    }
+
+def cluster_map_figure(grid, zoom: int) -> dict:
+    """One marker per grid cell (map_aggregation.grid_bins), sized by listings and coloured by median drive time."""
+    listings = _values(grid['listings'])
+    return {
+        "data": [{"type": 'scattermapbox', "mode": 'markers', "lat": _values(grid['latitude']), "lon": _values(grid['longitude']),
+                  "marker": {"size": listings, "color": _values(grid['median_duration_min']), "coloraxis": 'coloraxis',
+                             "sizemode": 'area', "sizeref": 2 * max(listings, default=1) / MAP_MARKER_SIZE_MAX ** 2},
+                  "hovertemplate": "listings=%{marker.size}<br>median_duration_min=%{marker.color}<extra></extra>"}],
+        "layout": {"template": FIGURE_TEMPLATE, **MAP_LAYOUT,
+                   "mapbox": {"style": MAP_STYLE, "center": MAP_CENTER, "zoom": zoom}},
+    }
+
+def build_artifacts(headline, histogram, winterized, grid, zoom: int, zoom_levels: list) -> dict:
+    """Headline metrics and figures of the dashboard's default view, as plain JSON."""
+    return {
+        "built_at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "zoom": zoom,
+        "zoom_levels": list(zoom_levels),
+        "headline": {key: None if headline[key] is None or math.isnan(headline[key]) else float(headline[key])
+                     for key in HEADLINE_KEYS},
+        "figures": {
+            **{metric: histogram_figure(histogram, metric) for metric in HISTOGRAM_TITLES},
+            "winterized": winterized_figure(winterized),
+            "map": cluster_map_figure(grid, zoom),
+        },
+    }
+
+def write_artifacts(artifacts: dict, path: str = DASHBOARD_ARTIFACTS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written aside and renamed, so the app never reads a half-written file
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(artifacts, f, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+    logging.info("Wrote the dashboard artifacts (%d figures) to %s", len(artifacts['figures']), path)
+
+def read_artifacts(path: str = DASHBOARD_ARTIFACTS_PATH) -> dict:
+    """The prebuilt default view, or None if the pipeline has not written it yet."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
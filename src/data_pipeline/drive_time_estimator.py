@@ -0,0 +1,224 @@
+import os
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.snapshot_store import STORE_DIR, load_snapshot, read_manifest
+
+# Configuration and Constants
+HEL_COORDS = (60.3172, 24.9633)  # Helsinki Airport
+EARTH_RADIUS_KM = 6371.0
+# Grid over Finland, in degrees
+GRID_BOUNDS = {"lat_min": 59.5, "lat_max": 70.5, "lon_min": 19.0, "lon_max": 32.0}
+CELL_SIZE = 0.25
+# A cell needs this many measured routes before its own median is trusted
+MIN_CELL_SAMPLES = 3
+GRID_PATH = os.path.abspath("data/cache/drive_time_grid.npz")
+
+
+def parse_distance_km(distance: pd.Series) -> pd.Series:
+    """Convert Google distance texts ('262 km', '1,204 km', '850 m') to kilometres."""
+    parts = distance.astype('string').str.extract(r'([\d,.]+)\s*(km|m)\b')
+    value = parts[0].str.replace(',', '', regex=False).astype(float)
+    return value.where(parts[1] != 'm', value / 1000)
+
+def parse_duration_min(duration: pd.Series) -> pd.Series:
+    """Convert Google duration texts ('3 hours 0 mins', '1 day 2 hours', '45 mins') to minutes."""
+    text = duration.astype('string')
+    parts = pd.DataFrame({
+        unit: text.str.extract(rf'(\d+)\s*{unit}', expand=False).astype(float)
+        for unit in ('day', 'hour', 'min')
+    })
+    minutes = parts['day'].fillna(0) * 1440 + parts['hour'].fillna(0) * 60 + parts['min'].fillna(0)
+    return minutes.where(parts.notna().any(axis=1))
+
+def route_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """Numeric distance_km and duration_min columns parsed from the distance and duration texts."""
+    return pd.DataFrame({
+        "distance_km": parse_distance_km(df['distance']),
+        "duration_min": parse_duration_min(df['duration']),
+    }, index=df.index)
+
+def format_distance(km: np.ndarray) -> list:
+    """Format kilometres like Google's distance texts."""
+    return [f"{round(value):,} km" if np.isfinite(value) else None for value in km]
+
+def format_duration(minutes: np.ndarray) -> list:
+    """Format minutes like Google's duration texts."""
+    texts = []
+    for value in minutes:
+        if not np.isfinite(value):
+            texts.append(None)
+            continue
+        hours, mins = divmod(int(round(value)), 60)
+        if hours:
+            texts.append(f"{hours} hour{'s' if hours != 1 else ''} {mins} min{'s' if mins != 1 else ''}")
+        else:
+            texts.append(f"{mins} min{'s' if mins != 1 else ''}")
+    return texts
+
+def haversine_km(latitude: np.ndarray, longitude: np.ndarray, origin: tuple = HEL_COORDS) -> np.ndarray:
+    """Great-circle distance from the origin, vectorized."""
+    lat1, lon1 = np.radians(origin)
+    lat2, lon2 = np.radians(np.asarray(latitude, dtype=float)), np.radians(np.asarray(longitude, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def load_measured_routes(store_dir: str = STORE_DIR) -> pd.DataFrame:
+    """Collect the measured (latitude, longitude, km, minutes) routes stored in the snapshots."""
+    routes = load_snapshot('all', columns=['latitude', 'longitude', 'distance', 'duration', 'route_estimated'], store_dir=store_dir)
+    # Estimates must not feed back into the estimator
+    routes = routes[~routes['route_estimated'].fillna(False)].drop(columns=['route_estimated', 'snapshot_date'])
+    routes = routes.dropna().drop_duplicates(['latitude', 'longitude'])
+    routes['distance_km'] = parse_distance_km(routes['distance'])
+    routes['duration_min'] = parse_duration_min(routes['duration'])
+    return routes.dropna(subset=['distance_km', 'duration_min']).reset_index(drop=True)
+
+
+class DriveTimeEstimator:
+    """Road distance and drive time from HEL as haversine distance x per-cell correction factors."""
+
+    def __init__(self, road_factor: np.ndarray, minutes_per_km: np.ndarray, cell_size: float = CELL_SIZE, store_key: str = None):
+        self.road_factor = road_factor
+        self.minutes_per_km = minutes_per_km
+        self.cell_size = cell_size
+        # The store_key() of the snapshots the grid was fitted on
+        self.store_key = store_key
+
+    @staticmethod
+    def _grid_shape(cell_size: float) -> tuple:
+        n_lat = int(np.ceil((GRID_BOUNDS["lat_max"] - GRID_BOUNDS["lat_min"]) / cell_size))
+        n_lon = int(np.ceil((GRID_BOUNDS["lon_max"] - GRID_BOUNDS["lon_min"]) / cell_size))
+        return n_lat, n_lon
+
+    def _cells(self, latitude: np.ndarray, longitude: np.ndarray) -> tuple:
+        n_lat, n_lon = self.road_factor.shape
+        rows = np.clip(((np.asarray(latitude, dtype=float) - GRID_BOUNDS["lat_min"]) // self.cell_size), 0, n_lat - 1)
+        cols = np.clip(((np.asarray(longitude, dtype=float) - GRID_BOUNDS["lon_min"]) // self.cell_size), 0, n_lon - 1)
+        return np.nan_to_num(rows).astype(int), np.nan_to_num(cols).astype(int)
+
+    @classmethod
+    def fit(cls, routes: pd.DataFrame, cell_size: float = CELL_SIZE) -> "DriveTimeEstimator":
+        """Learn per-cell median road factor and pace from measured routes."""
+        straight = haversine_km(routes['latitude'], routes['longitude'])
+        usable = straight > 1
+        samples = pd.DataFrame({
+            "road_factor": routes['distance_km'].to_numpy()[usable] / straight[usable],
+            "minutes_per_km": routes['duration_min'].to_numpy()[usable] / straight[usable],
+        })
+        shape = cls._grid_shape(cell_size)
+        estimator = cls(np.full(shape, np.nan), np.full(shape, np.nan), cell_size)
+        rows, cols = estimator._cells(routes['latitude'].to_numpy()[usable], routes['longitude'].to_numpy()[usable])
+        samples['cell'] = rows * shape[1] + cols
+
+        cell_stats = samples.groupby('cell').agg(['median', 'size'])
+        for surface in ('road_factor', 'minutes_per_km'):
+            trusted = cell_stats[(surface, 'size')] >= MIN_CELL_SAMPLES
+            grid = np.full(shape[0] * shape[1], np.nan)
+            grid[cell_stats.index[trusted]] = cell_stats.loc[trusted, (surface, 'median')]
+            filled = _fill_from_neighbours(grid.reshape(shape), fallback=samples[surface].median())
+            setattr(estimator, surface, filled)
+        return estimator
+
+    def predict(self, latitude: np.ndarray, longitude: np.ndarray) -> tuple:
+        """Estimated (road km, minutes) from HEL for every point, as NumPy arrays."""
+        straight = haversine_km(latitude, longitude)
+        rows, cols = self._cells(latitude, longitude)
+        return straight * self.road_factor[rows, cols], straight * self.minutes_per_km[rows, cols]
+
+    def error_stats(self, routes: pd.DataFrame) -> dict:
+        """Compare estimates with measured routes."""
+        km, minutes = self.predict(routes['latitude'], routes['longitude'])
+        km_error = km - routes['distance_km'].to_numpy()
+        min_error = minutes - routes['duration_min'].to_numpy()
+        return {
+            "n": len(routes),
+            "distance_mae_km": float(np.mean(np.abs(km_error))),
+            "distance_mape": float(np.mean(np.abs(km_error) / routes['distance_km'].to_numpy())),
+            "duration_mae_min": float(np.mean(np.abs(min_error))),
+            "duration_mape": float(np.mean(np.abs(min_error) / routes['duration_min'].to_numpy())),
+            "duration_p90_abs_min": float(np.percentile(np.abs(min_error), 90)),
+        }
+
+    def save(self, path: str = GRID_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, road_factor=self.road_factor, minutes_per_km=self.minutes_per_km, cell_size=self.cell_size,
+                 store_key=self.store_key or '')
+
+    @classmethod
+    def load(cls, path: str = GRID_PATH) -> "DriveTimeEstimator":
+        grid = np.load(path)
+        store_key = str(grid['store_key']) if 'store_key' in grid.files else None
+        return cls(grid['road_factor'], grid['minutes_per_km'], float(grid['cell_size']), store_key or None)
+
+
+def _fill_from_neighbours(grid: np.ndarray, fallback: float, max_passes: int = 50) -> np.ndarray:
+    """Fill empty cells with the mean of their filled neighbours, growing outwards from measured cells."""
+    grid = grid.copy()
+    for _ in range(max_passes):
+        empty = np.isnan(grid)
+        if not empty.any():
+            break
+        padded = np.pad(grid, 1, constant_values=np.nan)
+        neighbours = np.stack([padded[1 + dr:1 + dr + grid.shape[0], 1 + dc:1 + dc + grid.shape[1]]
+                               for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc])
+        counts = np.sum(~np.isnan(neighbours), axis=0)
+        sums = np.nansum(neighbours, axis=0)
+        fillable = empty & (counts > 0)
+        if not fillable.any():
+            break
+        grid[fillable] = sums[fillable] / counts[fillable]
+    grid[np.isnan(grid)] = fallback
+    return grid
+
+def store_key(store_dir: str = STORE_DIR) -> str:
+    """Identify the stored snapshots; the key changes whenever a snapshot is added or rewritten with other rows."""
+    return ','.join(f"{entry['snapshot']}:{entry['rows']}" for entry in read_manifest(store_dir))
+
+def fit_from_snapshots(holdout_fraction: float = 0.2, seed: int = 0) -> DriveTimeEstimator:
+    """Fit the estimator on the stored routes, logging its error on a held-out sample, and save the grid.
+
+    Returns None when the store holds no measured route yet.
+    """
+    routes = load_measured_routes()
+    if routes.empty:
+        logging.warning("No measured routes in the snapshot store to fit the drive time estimator on")
+        return None
+    holdout = routes.sample(frac=holdout_fraction, random_state=seed)
+    # Too few routes to hold some out: the held-out error is skipped
+    if len(holdout) and len(holdout) < len(routes):
+        stats = DriveTimeEstimator.fit(routes.drop(holdout.index)).error_stats(holdout)
+        logging.info("Drive time estimator held-out error: %s", {key: round(value, 3) for key, value in stats.items()})
+
+    estimator = DriveTimeEstimator.fit(routes)
+    estimator.store_key = store_key()
+    estimator.save()
+    return estimator
+
+def load_estimator(path: str = GRID_PATH) -> DriveTimeEstimator:
+    """The saved estimator if it was fitted on the snapshots stored now, otherwise a new fit (None on an empty store)."""
+    if os.path.exists(path):
+        estimator = DriveTimeEstimator.load(path)
+        if estimator.store_key == store_key():
+            logging.info("Loaded the drive time estimator fitted on the current store from %s", path)
+            return estimator
+    return fit_from_snapshots()
+
+def estimate_missing_routes(df: pd.DataFrame, estimator: DriveTimeEstimator = None) -> pd.DataFrame:
+    """Fill missing distance/duration texts of located listings with offline estimates, flagging them in route_estimated.
+
+    Without an estimator, the saved one (or a new fit) is loaded, only if some listing needs an estimate.
+    """
+    routes = df[['distance', 'duration']].astype(object)
+    routes['route_estimated'] = df['route_estimated'].fillna(False).astype(bool) if 'route_estimated' in df else False
+    missing = (routes['distance'].isna() | routes['duration'].isna()) & df['latitude'].notna() & df['longitude'].notna()
+    if missing.any() and estimator is None:
+        estimator = load_estimator()
+    if missing.any() and estimator is not None:
+        km, minutes = estimator.predict(df.loc[missing, 'latitude'], df.loc[missing, 'longitude'])
+        routes.loc[missing, 'distance'] = format_distance(km)
+        routes.loc[missing, 'duration'] = format_duration(minutes)
+        routes.loc[missing, 'route_estimated'] = True
+        logging.info("Estimated distance and duration offline for %d listings", missing.sum())
+    return routes
@@ -0,0 +1,78 @@
+import os
+import json
+from glob import glob
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+# Configuration and Constants
+FEED_DIR = 'data/cabins'
+LISTINGS_SUFFIX = '.listings.jsonl'
+DETAILS_SUFFIX = '.details.jsonl'
+LEGACY_SUFFIX = '.json'
+
+
+@dataclass
+class CabinListing:
+    """A result card from the search results crawl."""
+    address: Optional[str]
+    url: str
+    metrics: list = field(default_factory=list)
+    description: Optional[str] = None
+
+
+@dataclass
+class ListingDetails:
+    """The fields scraped from a listing's own page."""
+    url: str
+    rooms: Optional[str] = None
+    winterized: Optional[str] = None
+
+
+def snapshot_timestamp(path: str) -> str:
+    """Extract the '%Y%m%d-%H%M%S' timestamp from a feed or snapshot filename."""
+    return os.path.basename(path).split('_')[-1].split('.')[0]
+
+def feed_paths(timestamp: str, folder: str = FEED_DIR) -> tuple:
+    """Return the (listings, details) JSON-lines paths of a crawl."""
+    base = os.path.join(folder, f"etuovi_data_{timestamp}")
+    return base + LISTINGS_SUFFIX, base + DETAILS_SUFFIX
+
+def find_snapshots(folder: str = FEED_DIR) -> list:
+    """List the timestamps of every raw crawl snapshot, most recent first."""
+    paths = glob(os.path.join(folder, f'etuovi_data_*{LISTINGS_SUFFIX}')) + glob(os.path.join(folder, f'etuovi_data_*{LEGACY_SUFFIX}'))
+    return sorted({snapshot_timestamp(path) for path in paths}, reverse=True)
+
+def iter_json_lines(path: str) -> Iterator[dict]:
+    """Stream the records of a JSON-lines feed one line at a time."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def iter_legacy_feed(path: str) -> Iterator[list]:
+    """Decode the JSON arrays of a legacy feed, where both spiders appended to one file ('[...][...]')."""
+    with open(path, encoding='utf-8') as f:
+        data = f.read()
+    decoder = json.JSONDecoder()
+    position = 0
+    while True:
+        while position < len(data) and data[position].isspace():
+            position += 1
+        if position >= len(data):
+            return
+        records, position = decoder.raw_decode(data, position)
+        yield records
+
+def read_snapshot(timestamp: str, folder: str = FEED_DIR) -> tuple:
+    """Return (listings, details) record iterables of a crawl, whatever its feed format."""
+    listings_path, details_path = feed_paths(timestamp, folder)
+    if os.path.exists(listings_path):
+        details = iter_json_lines(details_path) if os.path.exists(details_path) else iter([])
+        return iter_json_lines(listings_path), details
+
+    legacy_path = os.path.join(folder, f"etuovi_data_{timestamp}{LEGACY_SUFFIX}")
+    arrays = list(iter_legacy_feed(legacy_path))
+    listings = arrays[0] if arrays else []
+    details = arrays[1] if len(arrays) > 1 else []
+    return iter(listings), iter(details)
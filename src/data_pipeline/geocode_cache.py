@@ -0,0 +1,86 @@
+import os
+import re
+import sqlite3
+import logging
+import unicodedata
+from datetime import datetime, timedelta
+
+# Configuration and Constants
+GEOCODE_CACHE_PATH = os.path.abspath("data/cache/geocode.sqlite")
+# Coordinates of an address practically never change; failed lookups are retried sooner
+TTL_DAYS = 365
+NEGATIVE_TTL_DAYS = 30
+COUNTRY_SUFFIXES = (', finland', ', suomi', ', åland islands')
+
+
+def normalize_address(address: str) -> str:
+    """Normalize an address into a cache key ('Vähä-Ytter 156,  Uusikaupunki' -> 'vähä-ytter 156, uusikaupunki')."""
+    key = unicodedata.normalize('NFKC', str(address)).lower()
+    key = re.sub(r'\s+', ' ', key)
+    key = re.sub(r'\s*,\s*', ', ', key).strip(' ,.')
+    for suffix in COUNTRY_SUFFIXES:
+        if key.endswith(suffix):
+            key = key[:-len(suffix)]
+    return key
+
+
+class GeocodeCache:
+    """On-disk geocoding cache shared by every provider and pipeline, keyed by normalized address."""
+
+    def __init__(self, path: str = GEOCODE_CACHE_PATH, ttl_days: int = TTL_DAYS, negative_ttl_days: int = NEGATIVE_TTL_DAYS):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Geocoding may run from worker threads
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocodes (
+                address_key TEXT PRIMARY KEY,
+                address TEXT,
+                latitude REAL,
+                longitude REAL,
+                provider TEXT,
+                resolved_at TEXT NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.ttl = timedelta(days=ttl_days)
+        self.negative_ttl = timedelta(days=negative_ttl_days)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, address: str):
+        """Return cached (latitude, longitude), (None, None) for a cached failure, or None on a miss."""
+        row = self.conn.execute(
+            "SELECT latitude, longitude, resolved_at FROM geocodes WHERE address_key = ?", (normalize_address(address),)
+        ).fetchone()
+        if row is not None:
+            latitude, longitude, resolved_at = row
+            ttl = self.ttl if latitude is not None else self.negative_ttl
+            if datetime.now() - datetime.fromisoformat(resolved_at) < ttl:
+                self.hits += 1
+                return (latitude, longitude)
+        self.misses += 1
+        return None
+
+    def put(self, address: str, coords: tuple, provider: str = None):
+        """Store a lookup result; (None, None) records a negative result."""
+        latitude, longitude = coords
+        self.conn.execute("""
+            INSERT INTO geocodes (address_key, address, latitude, longitude, provider, resolved_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (address_key) DO UPDATE SET
+                address = excluded.address,
+                latitude = excluded.latitude,
+                longitude = excluded.longitude,
+                provider = excluded.provider,
+                resolved_at = excluded.resolved_at
+        """, (normalize_address(address), address, latitude, longitude, provider if latitude is not None else None,
+              datetime.now().isoformat()))
+        self.conn.commit()
+
+    def log_stats(self, label: str = "Geocode cache"):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        logging.info("%s: %d hits, %d misses (%.0f%% hit rate)", label, self.hits, self.misses, hit_rate * 100)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,186 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.data_pipeline.geocode_cache import GeocodeCache, normalize_address
+
+# Configuration and Constants
+PROVIDER_URLS = {
+    "nominatim": "https://nominatim.openstreetmap.org/search",
+    "google": "https://maps.googleapis.com/maps/api/geocode/json",
+    "openrouteservice": "https://api.openrouteservice.org/geocode/search",
+}
+# Requests per second allowed by each provider's usage policy
+PROVIDER_RATES = {
+    "nominatim": 1.0,
+    "google": 40.0,
+    "openrouteservice": 1.5,
+}
+FALLBACK_CHAIN = ("nominatim", "google", "openrouteservice")
+USER_AGENT = "kesa_mokki_project"
+# A provider that found nothing returns (None, None); one that failed (network, quota, bad response) returns None
+NOT_FOUND = (None, None)
+MAX_WORKERS = 8
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting calls to `rate` per second, with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def make_session(pool_size: int = MAX_WORKERS, retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
+    """Create a keep-alive session whose connection pool retries throttled and failed calls with backoff."""
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=len(PROVIDER_URLS), pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def get_coordinates_nominatim(address: str, session: requests.Session, url: str = PROVIDER_URLS["nominatim"]) -> tuple:
+    """Get geographical coordinates using Nominatim; NOT_FOUND for an empty answer, None on error."""
+    try:
+        response = session.get(url, params={"q": address, "format": "json", "limit": 1}, timeout=30)
+        response.raise_for_status()
+        results = response.json()
+        if results == []:
+            return NOT_FOUND
+        return float(results[0]["lat"]), float(results[0]["lon"])
+    except Exception as e:
+        logging.warning("Error geocoding address with Nominatim %s: %s", address, e)
+        return None
+
+def get_coordinates_google(address: str, session: requests.Session, api_key: str, url: str = PROVIDER_URLS["google"]) -> tuple:
+    """Get geographical coordinates using Google Maps API; NOT_FOUND for ZERO_RESULTS, None on error."""
+    try:
+        response = session.get(url, params={"address": address, "key": api_key}, timeout=30)
+        response.raise_for_status()
+        body = response.json()
+        if body["status"] == "ZERO_RESULTS":
+            return NOT_FOUND
+        if body["status"] != "OK":
+            # OVER_QUERY_LIMIT, REQUEST_DENIED, INVALID_REQUEST or UNKNOWN_ERROR say nothing about the address
+            logging.warning("Google could not geocode %s: %s", address, body["status"])
+            return None
+        location = body["results"][0]["geometry"]["location"]
+        return location["lat"], location["lng"]
+    except Exception as e:
+        logging.warning("Error geocoding address with Google %s: %s", address, e)
+        return None
+
+def get_coordinates_openrouteservice(address: str, session: requests.Session, api_key: str, url: str = PROVIDER_URLS["openrouteservice"]) -> tuple:
+    """Get geographical coordinates using OpenRouteService API; NOT_FOUND for no features, None on error."""
+    try:
+        response = session.get(url, params={"api_key": api_key, "text": address}, timeout=30)
+        response.raise_for_status()
+        features = response.json()["features"]
+        if not features:
+            return NOT_FOUND
+        location = features[0]["geometry"]["coordinates"]
+        return location[1], location[0]
+    except Exception as e:
+        logging.warning("Error geocoding address with OpenRouteService %s: %s", address, e)
+        return None
+
+
+class GeocodingEngine:
+    """Concurrent Nominatim -> Google -> OpenRouteService geocoding over deduplicated addresses."""
+
+    def __init__(self, google_key: str, openrouteservice_key: str, cache: GeocodeCache = None,
+                 max_workers: int = MAX_WORKERS, rates: dict = None, urls: dict = None):
+        self.keys = {"google": google_key, "openrouteservice": openrouteservice_key}
+        self.cache = cache
+        self.max_workers = max_workers
+        self.urls = {**PROVIDER_URLS, **(urls or {})}
+        self.limiters = {provider: TokenBucket(rate) for provider, rate in {**PROVIDER_RATES, **(rates or {})}.items()}
+        self.session = make_session(pool_size=max_workers)
+        self.calls = {provider: 0 for provider in FALLBACK_CHAIN}
+        self.calls_lock = threading.Lock()
+
+    def lookup(self, provider: str, address: str) -> tuple:
+        """Call one provider once its rate limiter allows it."""
+        self.limiters[provider].acquire()
+        with self.calls_lock:
+            self.calls[provider] += 1
+        if provider == "nominatim":
+            return get_coordinates_nominatim(address, self.session, self.urls[provider])
+        if provider == "google":
+            return get_coordinates_google(address, self.session, self.keys[provider], self.urls[provider])
+        return get_coordinates_openrouteservice(address, self.session, self.keys[provider], self.urls[provider])
+
+    def geocode(self, address: str) -> tuple:
+        """Run the fallback chain for one address; returns ((latitude, longitude), provider).
+
+        Coordinates are NOT_FOUND when every provider found nothing, and None
+        when none found the address but at least one of them failed.
+        """
+        failed = False
+        for provider in FALLBACK_CHAIN:
+            coords = self.lookup(provider, address)
+            if coords is None:
+                failed = True
+            elif coords != NOT_FOUND:
+                return coords, provider
+        return (None if failed else NOT_FOUND), None
+
+    def geocode_many(self, addresses: Iterable[str]) -> dict:
+        """Geocode addresses concurrently, each distinct normalized address at most once; returns {address: coords}."""
+        addresses = list(addresses)
+        unique = {}
+        for address in addresses:
+            unique.setdefault(normalize_address(address), address)
+
+        results = {}
+        pending = []
+        for key, address in unique.items():
+            cached = self.cache.get(address) if self.cache else None
+            if cached is not None:
+                results[key] = cached
+            else:
+                pending.append((key, address))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.geocode, address): (key, address) for key, address in pending}
+            for future in as_completed(futures):
+                key, address = futures[future]
+                coords, provider = future.result()
+                results[key] = coords or NOT_FOUND
+                # The cache is only touched from this thread; failed lookups are retried on the next run
+                if self.cache and coords is not None:
+                    self.cache.put(address, coords, provider)
+        elapsed = time.perf_counter() - start
+
+        logging.info("Geocoded %d new addresses (%d distinct, %d cached) in %.1fs, provider calls: %s",
+                     len(pending), len(unique), len(unique) - len(pending), elapsed, self.calls)
+        return {address: results[normalize_address(address)] for address in addresses}
+
+    def close(self):
+        self.session.close()
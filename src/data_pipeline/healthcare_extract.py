@@ -5,6 +5,9 @@ import requests
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
+from src.data_pipeline.geocode_cache import GeocodeCache
+from src.data_pipeline.geocoding import NOT_FOUND, get_coordinates_openrouteservice, make_session
+
 # Load environment variables
 load_dotenv()
 OPENROUTESERVICE_KEY = os.getenv('OPENROUTESERVICE_API_KEY')
@@ -77,21 +80,17 @@ def fill_address(row, address_dict):
     """Fill missing addresses using a predefined dictionary."""
     return address_dict.get(row['name'], row['address']) if pd.isna(row['address']) else row['address']
 
-def get_coordinates_openrouteservice(address, api_key):
-    """Get latitude and longitude for an address using OpenRouteService API."""
-    try:
-        url = f'https://api.openrouteservice.org/geocode/search?api_key={api_key}&text={address}'
-        response = requests.get(url)
-        response_json = response.json()
-
-        if response.status_code == 200 and 'features' in response_json:
-            coordinates = response_json['features'][0]['geometry']['coordinates']
-            return coordinates[1], coordinates[0]
-        else:
-            return None, None
-    except Exception as e:
-        print(f"Error geocoding address {address}: {e}")
-        return None, None
+def get_coordinates_cached(address, api_key, cache, session):
+    """Look an address up in the shared geocode cache before asking OpenRouteService."""
+    cached = cache.get(address)
+    if cached is not None:
+        return cached
+    coords = get_coordinates_openrouteservice(address, session, api_key)
+    # A failed lookup says nothing about the address: it is not cached, and retried on the next run
+    if coords is None:
+        return NOT_FOUND
+    cache.put(address, coords, 'openrouteservice')
+    return coords
 
 def fill_lat_lon(row, lat_lon_dict):
     """Fill latitude and longitude manually for known locations."""
@@ -304,9 +303,13 @@ df_combined = df_combined[df_combined['address'] != '']
 df_combined.reset_index(drop=True, inplace=True)
 
 # Get coordinates for each address
+geocode_cache = GeocodeCache()
+geocode_session = make_session()
 df_combined[['latitude', 'longitude']] = df_combined['address'].apply(
-    lambda addr: pd.Series(get_coordinates_openrouteservice(addr, OPENROUTESERVICE_KEY))
+    lambda addr: pd.Series(get_coordinates_cached(addr, OPENROUTESERVICE_KEY, geocode_cache, geocode_session))
 )
+geocode_session.close()
+geocode_cache.log_stats()
 
 # Manually correct known coordinates
 lat_lon_dict = {
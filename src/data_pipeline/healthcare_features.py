@@ -0,0 +1,109 @@
+import logging
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Configuration and Constants
+HEALTHCARE_PATH = 'data/healthcare/healthcare_locations.csv'
+EARTH_RADIUS_KM = 6371.0
+# The *_count columns count the facilities within this distance of each cabin
+HEALTHCARE_RADIUS_KM = 30.0
+# A few geocodes landed outside Finland (e.g. a same-named town abroad); they are dropped
+FINLAND_BOUNDS = {"latitude": (59.0, 71.0), "longitude": (19.0, 32.0)}
+# Cabins compared at once against every facility when SciPy is not installed
+POINT_CHUNK = 4096
+# Column prefix per facility type of healthcare_locations.csv
+FACILITY_TYPES = {"Hospital": 'hospital', "Health Center": 'health_center'}
+HEALTHCARE_COLUMNS = [
+    'nearest_hospital', 'hospital_km', 'hospital_count',
+    'nearest_health_center', 'health_center_km', 'health_center_count',
+]
+
+
+def unit_vectors(latitude, longitude) -> np.ndarray:
+    """Points on the unit sphere; the straight-line (chord) distance between them grows with the great-circle distance."""
+    lat, lon = np.radians(np.asarray(latitude, dtype=float)), np.radians(np.asarray(longitude, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+def km_to_chord(km: float) -> float:
+    return 2 * np.sin(km / (2 * EARTH_RADIUS_KM))
+
+
+class FacilityIndex:
+    """Nearest-neighbour and radius queries over one type of facility.
+
+    Facilities are indexed as 3D unit vectors, so a Euclidean KD-tree gives
+    exact great-circle neighbours without any haversine per pair. Without
+    SciPy, cabins are compared against every facility in chunks instead.
+    """
+
+    def __init__(self, names: np.ndarray, latitude: np.ndarray, longitude: np.ndarray):
+        self.names = np.asarray(names, dtype=object)
+        self.vectors = unit_vectors(latitude, longitude)
+        self.tree = cKDTree(self.vectors) if cKDTree is not None else None
+
+    def query(self, vectors: np.ndarray, radius_km: float) -> tuple:
+        """Index of and distance (km) to the nearest facility, and facilities within radius_km, for each point."""
+        if self.tree is not None:
+            chord, nearest = self.tree.query(vectors)
+            counts = self.tree.query_ball_point(vectors, km_to_chord(radius_km), return_length=True)
+            return nearest, chord_to_km(chord), counts
+
+        nearest, chord, counts = np.empty(len(vectors), dtype=int), np.empty(len(vectors)), np.empty(len(vectors), dtype=int)
+        for start in range(0, len(vectors), POINT_CHUNK):
+            chunk = slice(start, start + POINT_CHUNK)
+            # For unit vectors |a - b|² = 2 - 2 a·b
+            squared = np.clip(2 - 2 * vectors[chunk] @ self.vectors.T, 0, None)
+            nearest[chunk] = squared.argmin(axis=1)
+            chord[chunk] = np.sqrt(squared[np.arange(len(squared)), nearest[chunk]])
+            counts[chunk] = (squared <= km_to_chord(radius_km) ** 2).sum(axis=1)
+        return nearest, chord_to_km(chord), counts
+
+
+@lru_cache(maxsize=None)
+def load_facilities(path: str = HEALTHCARE_PATH) -> dict:
+    """One FacilityIndex per facility type, built once per process."""
+    locations = pd.read_csv(path).dropna(subset=['latitude', 'longitude'])
+    inside = np.ones(len(locations), dtype=bool)
+    for column, (low, high) in FINLAND_BOUNDS.items():
+        inside &= locations[column].between(low, high).to_numpy()
+    if (~inside).any():
+        logging.info("Ignored %d healthcare locations outside Finland", (~inside).sum())
+    locations = locations[inside]
+
+    indexes = {}
+    for facility_type, prefix in FACILITY_TYPES.items():
+        facilities = locations[locations['type'] == facility_type]
+        indexes[prefix] = FacilityIndex(facilities['name'].to_numpy(), facilities['latitude'].to_numpy(),
+                                        facilities['longitude'].to_numpy())
+    logging.info("Indexed healthcare locations: %s", {prefix: len(index.names) for prefix, index in indexes.items()})
+    return indexes
+
+def healthcare_features(df: pd.DataFrame, path: str = HEALTHCARE_PATH, radius_km: float = HEALTHCARE_RADIUS_KM) -> pd.DataFrame:
+    """Nearest hospital and health center of every listing, their distance in km and how many lie within radius_km.
+
+    Listings without coordinates get missing values.
+    """
+    latitude, longitude = df['latitude'].to_numpy(dtype=float), df['longitude'].to_numpy(dtype=float)
+    located = ~(np.isnan(latitude) | np.isnan(longitude))
+    vectors = unit_vectors(latitude[located], longitude[located])
+
+    features = {}
+    for prefix, index in load_facilities(path).items():
+        names, km, counts = np.full(len(df), None, dtype=object), np.full(len(df), np.nan), np.zeros(len(df), dtype=np.int16)
+        if located.any():
+            nearest, km[located], counts[located] = index.query(vectors, radius_km)
+            names[located] = index.names[nearest]
+        features[f'nearest_{prefix}'] = names
+        features[f'{prefix}_km'] = km
+        features[f'{prefix}_count'] = pd.arrays.IntegerArray(counts, ~located)
+    return pd.DataFrame(features, index=df.index)[HEALTHCARE_COLUMNS]
@@ -0,0 +1,70 @@
+import os
+import logging
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.data_pipeline.snapshot_store import STORE_DIR, load_snapshot
+
+# Configuration and Constants
+HISTORY_PATH = os.path.join(STORE_DIR, 'listing_history.parquet')
+# Attributes a listing keeps across snapshots, including weeks it was not listed
+HISTORY_COLUMNS = [
+    'first_posting_date', 'last_posting_date', 'original_price', 'price',
+    'latitude', 'longitude', 'distance', 'duration', 'route_estimated', 'fingerprint',
+    'address', 'surface', 'year', 'property_id',
+]
+DATE_COLUMNS = ['first_posting_date', 'last_posting_date']
+
+
+def _as_history(df: pd.DataFrame) -> pd.DataFrame:
+    """Index a listings frame by URL and keep the history columns."""
+    history = df.set_index('url').reindex(columns=HISTORY_COLUMNS)
+    for column in DATE_COLUMNS:
+        history[column] = pd.to_datetime(history[column])
+    history['route_estimated'] = history['route_estimated'].astype('boolean')
+    return history
+
+def empty_history() -> pd.DataFrame:
+    """A history index without any listing yet."""
+    return _as_history(pd.DataFrame({
+        'url': pd.Series(dtype=object),
+        **{column: pd.Series(dtype=float) for column in HISTORY_COLUMNS},
+        'distance': pd.Series(dtype=object),
+        'duration': pd.Series(dtype=object),
+        'fingerprint': pd.Series(dtype=object),
+        'address': pd.Series(dtype=object),
+        'property_id': pd.Series(dtype=object),
+    }))
+
+def build_history(store_dir: str = STORE_DIR) -> pd.DataFrame:
+    """Build the listing history index from every stored snapshot."""
+    snapshots = load_snapshot('all', columns=['url'] + HISTORY_COLUMNS, store_dir=store_dir)
+    snapshots = snapshots.reindex(columns=['url'] + HISTORY_COLUMNS)
+
+    # Snapshots load in chronological order: the first record of a URL holds its original date and price,
+    # the last non-missing value of the other attributes is the most recent one
+    grouped = snapshots.groupby('url', sort=False)
+    history = grouped.last()
+    history[['first_posting_date', 'original_price']] = grouped[['first_posting_date', 'original_price']].first()
+    return _as_history(history.reset_index())
+
+def load_history(path: str = HISTORY_PATH) -> pd.DataFrame:
+    """Load the listing history index, building it from the snapshots the first time or after new columns were added."""
+    if not os.path.exists(path) or set(HISTORY_COLUMNS) - set(pq.read_schema(path).names):
+        history = build_history(os.path.dirname(path))
+        save_history(history, path)
+        logging.info("Built listing history of %d URLs", len(history))
+        return history
+    return pd.read_parquet(path).reindex(columns=HISTORY_COLUMNS)
+
+def update_history(history: pd.DataFrame, final_df: pd.DataFrame) -> pd.DataFrame:
+    """Fold a processed snapshot into the history index."""
+    latest = _as_history(final_df)
+    if history.empty:
+        return latest
+    return pd.concat([history[~history.index.isin(latest.index)], latest])
+
+def save_history(history: pd.DataFrame, path: str = HISTORY_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    history.to_parquet(path)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.regions import Regions
+
+# Configuration and Constants
+# Grid cell height in degrees per map zoom level; cells are twice as wide, roughly square at Finnish latitudes
+ZOOM_CELL_SIZES = {4: 0.5, 5: 0.25, 6: 0.125, 7: 0.0625}
+DEFAULT_ZOOM = 4
+
+
+def grid_bins(points: pd.DataFrame, zoom: int = DEFAULT_ZOOM) -> pd.DataFrame:
+    """One marker per grid cell: its listings' mean position, count and median drive time.
+
+    The number of markers is bounded by the number of cells covering Finland at
+    that zoom, however many listings there are.
+    """
+    cell_size = ZOOM_CELL_SIZES[zoom]
+    located = points.dropna(subset=['latitude', 'longitude'])
+    cells = pd.DataFrame({
+        "row": np.floor(located['latitude'].to_numpy() / cell_size).astype(int),
+        "col": np.floor(located['longitude'].to_numpy() / (2 * cell_size)).astype(int),
+        "latitude": located['latitude'].to_numpy(),
+        "longitude": located['longitude'].to_numpy(),
+        "duration_min": located['duration_min'].to_numpy(dtype=float),
+    })
+    return (cells.groupby(['row', 'col'], sort=False)
+            .agg(latitude=('latitude', 'mean'), longitude=('longitude', 'mean'),
+                 listings=('latitude', 'size'), median_duration_min=('duration_min', 'median'))
+            .reset_index(drop=True))
+
+def precompute_grids(points: pd.DataFrame) -> dict:
+    """Grid bins at every zoom level."""
+    return {zoom: grid_bins(points, zoom) for zoom in ZOOM_CELL_SIZES}
+
+def region_summary(points: pd.DataFrame, regions: Regions) -> pd.DataFrame:
+    """Listings, median price and median drive time per region, for a choropleth."""
+    region = points['region'] if 'region' in points else regions.assign(points['latitude'], points['longitude']).set_axis(points.index)
+    summary = (points.assign(region=region)
+               .groupby('region')
+               .agg(listings=('price', 'size'), median_price=('price', 'median'),
+                    median_duration_min=('duration_min', 'median')))
+    return summary.reindex(regions.names).fillna({'listings': 0}).rename_axis('region').reset_index()
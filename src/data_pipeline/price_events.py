@@ -0,0 +1,127 @@
+import os
+import shutil
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.data_pipeline.snapshot_store import STORE_DIR, load_snapshot
+
+# Configuration and Constants
+PRICE_EVENTS_DIR = os.path.join(STORE_DIR, 'price_events')
+PARTITION_KEY = 'event_date'
+EVENT_TYPES = ['listed', 'cut', 'increase']
+
+PRICE_EVENTS_SCHEMA = pa.schema([
+    ('url', pa.string()),
+    ('price', pa.float64()),
+    ('previous_price', pa.float64()),
+    ('change', pa.float64()),
+    ('event_type', pa.string()),
+])
+PARTITIONING = ds.partitioning(pa.schema([(PARTITION_KEY, pa.date32())]), flavor='hive')
+DATASET_SCHEMA = PRICE_EVENTS_SCHEMA.append(pa.field(PARTITION_KEY, pa.date32()))
+
+# Postgres side: the primary key serves per-URL trajectories, the partial index recent cuts
+PRICE_EVENTS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS price_events (
+        url TEXT NOT NULL,
+        event_date DATE NOT NULL,
+        price NUMERIC,
+        previous_price NUMERIC,
+        change NUMERIC,
+        event_type TEXT NOT NULL,
+        PRIMARY KEY (url, event_date)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS price_events_cuts_idx ON price_events (event_date) WHERE event_type = 'cut'",
+]
+
+
+def diff_prices(history: pd.DataFrame, final_df: pd.DataFrame) -> pd.DataFrame:
+    """Price events of a processed snapshot against the last known price of every listing in the history."""
+    current = final_df.drop_duplicates('url').set_index('url')['price']
+    previous = history['price'].reindex(current.index)
+    known = current.index.isin(history.index)
+
+    changed = known & current.notna().to_numpy() & ~(current == previous).to_numpy()
+    events = pd.DataFrame({
+        'url': current.index,
+        'price': current.to_numpy(),
+        'previous_price': previous.to_numpy(),
+    })[~known | changed].reset_index(drop=True)
+    events['change'] = events['price'] - events['previous_price']
+    events['event_type'] = np.select([events['previous_price'].isna(), events['change'] < 0], ['listed', 'cut'], 'increase')
+    return events.sort_values('url', ignore_index=True)
+
+def append_price_events(events: pd.DataFrame, snapshot: str, events_dir: str = PRICE_EVENTS_DIR, replace: bool = False) -> str:
+    """Write a snapshot's events as its own date partition.
+
+    A partition already written is kept: reprocessing a snapshot diffs it
+    against a history that already holds it, which finds no event. Only the
+    replays from the first snapshot on (build_price_events, backfill) pass
+    replace=True.
+    """
+    event_date = datetime.strptime(snapshot, '%Y%m%d-%H%M%S').date().isoformat()
+    path = os.path.join(events_dir, f"{PARTITION_KEY}={event_date}", 'part-0.parquet')
+    if os.path.exists(path) and not replace:
+        logging.info("Kept the price events already recorded for %s", event_date)
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(events.reindex(columns=PRICE_EVENTS_SCHEMA.names), schema=PRICE_EVENTS_SCHEMA, preserve_index=False)
+    # Rows are sorted by URL, so row group statistics let per-URL reads skip most of each file
+    pq.write_table(table, path, compression='zstd', row_group_size=256)
+    logging.info("Recorded %d price events for %s", len(events), event_date)
+    return path
+
+def load_price_events(url: str = None, since=None, event_type: str = None, events_dir: str = PRICE_EVENTS_DIR) -> pd.DataFrame:
+    """Load price events, optionally only those of one URL, from a date ('YYYY-MM-DD') on, or of one type."""
+    if not os.path.isdir(events_dir):
+        events = DATASET_SCHEMA.empty_table().to_pandas()
+    else:
+        dataset = ds.dataset(events_dir, schema=DATASET_SCHEMA, format='parquet', partitioning=PARTITIONING)
+        conditions = []
+        if url is not None:
+            conditions.append(ds.field('url') == url)
+        if since is not None:
+            conditions.append(ds.field(PARTITION_KEY) >= pd.Timestamp(since).date())
+        if event_type is not None:
+            conditions.append(ds.field('event_type') == event_type)
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        events = dataset.to_table(filter=expression).to_pandas()
+    events[PARTITION_KEY] = pd.to_datetime(events[PARTITION_KEY])
+    return events.sort_values([PARTITION_KEY, 'url'], ignore_index=True)
+
+def price_trajectory(url: str, events_dir: str = PRICE_EVENTS_DIR) -> pd.DataFrame:
+    """Every recorded price of one listing, oldest first."""
+    return load_price_events(url=url, events_dir=events_dir)[[PARTITION_KEY, 'price', 'change', 'event_type']]
+
+def recent_cuts(weeks: int, as_of=None, events_dir: str = PRICE_EVENTS_DIR) -> pd.DataFrame:
+    """All price cuts of the last N weeks."""
+    as_of = pd.Timestamp(as_of) if as_of is not None else pd.Timestamp(datetime.now().date())
+    return load_price_events(since=as_of - timedelta(weeks=weeks), event_type='cut', events_dir=events_dir)
+
+def build_price_events(store_dir: str = STORE_DIR, events_dir: str = PRICE_EVENTS_DIR) -> int:
+    """Rebuild the event log by replaying every stored snapshot in chronological order."""
+    snapshots = load_snapshot('all', columns=['url', 'price'], store_dir=store_dir)
+    shutil.rmtree(events_dir, ignore_errors=True)
+    history = pd.DataFrame({'price': pd.Series(dtype=float)}, index=pd.Index([], name='url', dtype=object))
+    n_events = 0
+    for snapshot_date, snapshot in snapshots.groupby('snapshot_date', sort=True):
+        events = diff_prices(history, snapshot)
+        append_price_events(events, snapshot_date.strftime('%Y%m%d-%H%M%S'), events_dir, replace=True)
+        latest = snapshot.drop_duplicates('url').set_index('url')[['price']]
+        history = pd.concat([history[~history.index.isin(latest.index)], latest])
+        n_events += len(events)
+    return n_events
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    build_price_events()
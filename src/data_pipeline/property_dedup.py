@@ -0,0 +1,151 @@
+import re
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.geocode_cache import normalize_address
+
+# Configuration and Constants
+DEDUP_COLUMNS = ['url', 'address', 'surface', 'year', 'latitude', 'longitude', 'property_id']
+ROUTE_COLUMNS = ['latitude', 'longitude', 'distance', 'duration', 'route_estimated']
+# Rounded coordinates (3 decimals, ~100 m) block listings geocoded to the same spot
+COORD_DECIMALS = 3
+# Blocks larger than this are skipped rather than compared all-pairs (e.g. a municipality-only geocode)
+MAX_BLOCK_SIZE = 200
+# Weights of the similarity components; a missing component does not count
+WEIGHTS = {"address": 0.5, "surface": 0.25, "year": 0.15, "coords": 0.1}
+MATCH_THRESHOLD = 0.85
+# Surfaces further apart than this (relative) belong to different buildings
+SURFACE_TOLERANCE = 0.1
+TOKEN_PATTERN = re.compile(r'[^\W\d_]+|\d+')
+
+
+def address_parts(addresses: pd.Series) -> pd.DataFrame:
+    """Normalized tokens, street, house number and municipality of each address."""
+    normalized = addresses.fillna('').map(normalize_address)
+    parts = normalized.str.split(', ')
+    street_part = parts.str[0]
+    return pd.DataFrame({
+        "tokens": [frozenset(TOKEN_PATTERN.findall(address)) for address in normalized],
+        "street": street_part.str.extract(r'^([^\W\d_][\w-]*)', expand=False),
+        "number": street_part.str.findall(r'\d+').str.join('-'),
+        "municipality": parts.str[-1],
+    }, index=addresses.index)
+
+def candidate_pairs(parts: pd.DataFrame, latitude: pd.Series, longitude: pd.Series) -> np.ndarray:
+    """Row pairs (i < j) sharing a blocking key: municipality + street name, or municipality + rounded coordinates."""
+    keys = pd.DataFrame({
+        "street": parts['municipality'] + '|' + parts['street'],
+        "coords": parts['municipality'] + '|' + latitude.round(COORD_DECIMALS).astype(str) + '|' + longitude.round(COORD_DECIMALS).astype(str),
+    })
+    keys.loc[parts['street'].isna(), 'street'] = None
+    keys.loc[latitude.isna() | longitude.isna(), 'coords'] = None
+
+    pairs = []
+    for column in keys:
+        block = pd.DataFrame({"key": keys[column].to_numpy(), "row": np.arange(len(keys))}).dropna()
+        sizes = block.groupby('key')['row'].transform('size')
+        skipped = block.loc[sizes > MAX_BLOCK_SIZE, 'key'].nunique()
+        if skipped:
+            logging.info("Skipped %d oversized %s blocks", skipped, column)
+        block = block[(sizes > 1) & (sizes <= MAX_BLOCK_SIZE)]
+        joined = block.merge(block, on='key')
+        joined = joined[joined['row_x'] < joined['row_y']]
+        pairs.append(joined[['row_x', 'row_y']].to_numpy())
+    if not pairs:
+        return np.empty((0, 2), dtype=int)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+def similarity(listings: pd.DataFrame, parts: pd.DataFrame, pairs: np.ndarray) -> np.ndarray:
+    """Weighted similarity of each candidate pair; conflicting house numbers, years or surfaces score 0,
+    as do pairs without any building attribute to compare."""
+    left, right = pairs[:, 0], pairs[:, 1]
+    tokens = parts['tokens'].to_numpy()
+    address = np.array([len(tokens[i] & tokens[j]) / max(len(tokens[i] | tokens[j]), 1) for i, j in pairs], dtype=float)
+
+    surface = listings['surface'].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        surface_gap = np.abs(surface[left] - surface[right]) / np.fmax(surface[left], surface[right])
+    surface_score = 1 - surface_gap / SURFACE_TOLERANCE
+
+    year = listings['year'].astype(float).to_numpy()
+    year_score = np.where(np.isnan(year[left]) | np.isnan(year[right]), np.nan, (year[left] == year[right]).astype(float))
+
+    latitude, longitude = listings['latitude'].to_numpy(dtype=float), listings['longitude'].to_numpy(dtype=float)
+    coords_score = ((np.abs(latitude[left] - latitude[right]) < 10 ** -COORD_DECIMALS) &
+                    (np.abs(longitude[left] - longitude[right]) < 10 ** -COORD_DECIMALS)).astype(float)
+    coords_score[np.isnan(latitude[left]) | np.isnan(latitude[right])] = np.nan
+
+    components = np.column_stack([address, surface_score, year_score, coords_score])
+    weights = np.array(list(WEIGHTS.values()))
+    available = ~np.isnan(components)
+    score = np.nansum(components * weights, axis=1) / (available * weights).sum(axis=1)
+
+    numbers = parts['number'].to_numpy()
+    conflict = (numbers[left] != numbers[right]) | (year_score == 0) | (surface_gap > SURFACE_TOLERANCE)
+    # Address and location alone cannot tell apart the cabins of one plot
+    conflict |= np.isnan(surface_score) & np.isnan(year_score)
+    return np.where(conflict, 0.0, score)
+
+def _clusters(n_rows: int, matches: np.ndarray) -> np.ndarray:
+    """Connected components of the matched pairs, as one root row per row (union-find)."""
+    parent = np.arange(n_rows)
+
+    def find(row):
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    for left, right in matches:
+        root_left, root_right = find(left), find(right)
+        if root_left != root_right:
+            parent[max(root_left, root_right)] = min(root_left, root_right)
+    return np.array([find(row) for row in range(n_rows)])
+
+def new_property_id(url: str) -> str:
+    return 'p' + hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+
+def assign_property_ids(listings: pd.DataFrame) -> pd.Series:
+    """Group listings of the same property and return a stable property_id per URL.
+
+    A group keeps the smallest property_id any of its listings already had;
+    groups without one are named after their smallest URL.
+    """
+    listings = listings.reindex(columns=DEDUP_COLUMNS).drop_duplicates('url', keep='last').reset_index(drop=True)
+    parts = address_parts(listings['address'])
+    pairs = candidate_pairs(parts, listings['latitude'].astype(float), listings['longitude'].astype(float))
+    matches = pairs[similarity(listings, parts, pairs) >= MATCH_THRESHOLD]
+
+    groups = pd.DataFrame({"root": _clusters(len(listings), matches), "url": listings['url'], "property_id": listings['property_id']})
+    known_ids = groups.sort_values('property_id').groupby('root')['property_id'].first()
+    fresh_ids = groups.sort_values('url').groupby('root')['url'].first().map(new_property_id)
+    property_ids = known_ids.fillna(fresh_ids)
+
+    logging.info("Deduplicated %d listings into %d properties (%d candidate pairs, %d matches)",
+                 len(listings), len(property_ids), len(pairs), len(matches))
+    return pd.Series(property_ids.reindex(groups['root']).to_numpy(), index=listings['url'], name='property_id')
+
+def deduplicate(df: pd.DataFrame, history: pd.DataFrame) -> pd.Series:
+    """Property IDs of a snapshot's listings, matched against each other and every listing in the history."""
+    # The history is empty on the first snapshot, and must not take part in the dtypes then
+    known = [history.rename_axis('url').reset_index()] if not history.empty else []
+    property_ids = assign_property_ids(pd.concat(known + [df], ignore_index=True))
+    return pd.Series(property_ids.reindex(df['url']).to_numpy(), index=df.index, name='property_id')
+
+def share_property_routes(df: pd.DataFrame, history: pd.DataFrame) -> pd.DataFrame:
+    """Fill the missing coordinates and routes of listings from other listings of the same property."""
+    routes = df[ROUTE_COLUMNS].copy()
+    missing = routes['latitude'].isna().to_numpy()
+    if not missing.any():
+        return routes
+    # Prefer Google-measured routes over estimated ones
+    known = history[history['property_id'].notna() & history['latitude'].notna()].reindex(columns=ROUTE_COLUMNS + ['property_id'])
+    known = known.sort_values('route_estimated', key=lambda flag: flag.fillna(False).astype(bool)).drop_duplicates('property_id')
+    shared = known.set_index('property_id').reindex(df['property_id'])[ROUTE_COLUMNS]
+    fill = missing & shared['latitude'].notna().to_numpy()
+    routes.loc[fill, ROUTE_COLUMNS] = shared.loc[fill, ROUTE_COLUMNS].to_numpy()
+    logging.info("Reused the location and route of another listing of the same property for %d listings", fill.sum())
+    return routes
@@ -0,0 +1,243 @@
+import json
+import logging
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Configuration and Constants
+# Detailed polygons (Åland included); the pipeline tags listings and the dashboard draws regions with the same file
+REGIONS_PATH = 'data/mapping/finland-with-regions_.geojson'
+# Height of the latitude bands of the edge index, in degrees
+BAND_SIZE = 0.01
+# Points up to this far outside every polygon (geocoded on the shore or on a small island) take the nearest region
+COAST_TOLERANCE_KM = 5.0
+KM_PER_DEGREE = 111.2
+CACHE_DECIMALS = 4
+POINT_CHUNK = 4096
+# The dashboard draws the polygons simplified to this tolerance, in degrees (about a kilometre); tagging keeps every vertex
+DISPLAY_TOLERANCE = 0.01
+DISPLAY_DECIMALS = 3
+# Property holding the region name, per file format
+NAME_PROPERTIES = {"Topology": 'NAME_2', "FeatureCollection": 'name'}
+
+
+def _decode_arcs(topology: dict) -> list:
+    """Absolute (lon, lat) coordinates of every delta-encoded, quantized TopoJSON arc."""
+    scale, translate = np.array(topology['transform']['scale']), np.array(topology['transform']['translate'])
+    return [np.cumsum(np.array(arc, dtype=float), axis=0) * scale + translate for arc in topology['arcs']]
+
+def _ring(arc_indices: list, arcs: list) -> np.ndarray:
+    """Stitch a ring from its arcs; a negative index ~i is arc i reversed."""
+    parts = []
+    for position, index in enumerate(arc_indices):
+        coords = arcs[index] if index >= 0 else arcs[~index][::-1]
+        parts.append(coords if position == 0 else coords[1:])
+    return np.concatenate(parts)
+
+def topology_to_features(topology: dict) -> list:
+    """Convert the first object of a TopoJSON topology to GeoJSON features."""
+    arcs = _decode_arcs(topology)
+    collection = next(iter(topology['objects'].values()))
+    features = []
+    for geometry in collection['geometries']:
+        polygons = geometry['arcs'] if geometry['type'] == 'MultiPolygon' else [geometry['arcs']]
+        features.append({
+            "type": "Feature",
+            "properties": geometry.get('properties', {}),
+            "geometry": {"type": "MultiPolygon",
+                         "coordinates": [[_ring(ring, arcs).tolist() for ring in polygon] for polygon in polygons]},
+        })
+    return features
+
+def simplify_ring(ring: np.ndarray, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker: keep the vertices farther than tolerance from the chord between the kept vertices around them."""
+    keep = np.zeros(len(ring), dtype=bool)
+    keep[[0, -1]] = True
+    spans = [(0, len(ring) - 1)]
+    while spans:
+        start, end = spans.pop()
+        if end - start < 2:
+            continue
+        chord = ring[end] - ring[start]
+        offsets = ring[start + 1:end] - ring[start]
+        length = np.hypot(*chord)
+        # A closed ring starts and ends on the same vertex: distances to it instead of to a chord
+        distances = (np.abs(chord[0] * offsets[:, 1] - chord[1] * offsets[:, 0]) / length if length
+                     else np.hypot(offsets[:, 0], offsets[:, 1]))
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            middle = start + 1 + farthest
+            keep[middle] = True
+            spans += [(start, middle), (middle, end)]
+    return ring[keep]
+
+
+class Regions:
+    """Named region polygons, as GeoJSON for choropleths and as a latitude-band edge index for point-in-polygon tests.
+
+    A point is inside a region when a ray cast from it westwards crosses the
+    region's edges an odd number of times (holes and multipolygons included).
+    Only edges spanning the point's latitude can cross that ray, so edges are
+    bucketed by latitude band and each point is tested against its band only.
+    """
+
+    def __init__(self, features: list, name_property: str, band_size: float = BAND_SIZE,
+                 coast_tolerance_km: float = COAST_TOLERANCE_KM):
+        # Regions split over several features (e.g. Päijänne Tavastia) are merged into one MultiPolygon
+        polygons = {}
+        for feature in features:
+            geometry = feature['geometry']
+            parts = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+            polygons.setdefault(feature['properties'][name_property], []).extend(parts)
+        self.names = list(polygons)
+        self.geojson = {"type": "FeatureCollection", "features": [
+            {"type": "Feature", "id": name, "properties": {"name": name},
+             "geometry": {"type": "MultiPolygon", "coordinates": parts}}
+            for name, parts in polygons.items()
+        ]}
+        self.band_size = band_size
+        self.coast_tolerance_km = coast_tolerance_km
+        self.cache = pd.Series(dtype=object)
+        self._build_index([[np.asarray(ring, dtype=float) for polygon in parts for ring in polygon]
+                           for parts in polygons.values()])
+
+    def display_geojson(self, tolerance: float = DISPLAY_TOLERANCE, decimals: int = DISPLAY_DECIMALS) -> dict:
+        """The regions simplified for drawing; rings left with fewer than four vertices (small islets) are dropped."""
+        features = []
+        for feature in self.geojson['features']:
+            polygons = []
+            for polygon in feature['geometry']['coordinates']:
+                rings = [np.round(simplify_ring(np.asarray(ring, dtype=float), tolerance), decimals) for ring in polygon]
+                rings = [ring.tolist() for ring in rings if len(ring) >= 4]
+                if rings:
+                    polygons.append(rings)
+            features.append({**feature, "geometry": {"type": "MultiPolygon", "coordinates": polygons}})
+        return {"type": "FeatureCollection", "features": features}
+
+    def _build_index(self, region_rings: list):
+        edges, owners = [], []
+        for region, rings in enumerate(region_rings):
+            for ring in rings:
+                if not np.array_equal(ring[0], ring[-1]):
+                    ring = np.vstack([ring, ring[:1]])
+                edges.append(np.hstack([ring[:-1], ring[1:]]))
+                owners.append(np.full(len(ring) - 1, region))
+        edges, owners = np.concatenate(edges), np.concatenate(owners)
+        # Horizontal edges never cross a horizontal ray
+        keep = edges[:, 1] != edges[:, 3]
+        self.edges, self.owners = edges[keep], owners[keep]
+
+        self.lat_min = self.edges[:, [1, 3]].min()
+        self.n_bands = int((self.edges[:, [1, 3]].max() - self.lat_min) // self.band_size) + 1
+        low = self._band(self.edges[:, [1, 3]].min(axis=1))
+        high = self._band(self.edges[:, [1, 3]].max(axis=1))
+        # Every edge is listed in each band its latitude range overlaps, bands stored contiguously
+        counts = high - low + 1
+        edge_ids = np.repeat(np.arange(len(self.edges)), counts)
+        bands = np.repeat(low, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+        order = np.argsort(bands, kind='stable')
+        self.band_edges = edge_ids[order]
+        self.band_starts = np.searchsorted(bands[order], np.arange(self.n_bands + 1))
+
+    def _band(self, latitude: np.ndarray) -> np.ndarray:
+        return np.floor((latitude - self.lat_min) / self.band_size).astype(int)
+
+    @classmethod
+    def load(cls, path: str = REGIONS_PATH) -> "Regions":
+        """Load regions from a TopoJSON topology or a GeoJSON feature collection."""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        features = topology_to_features(data) if data['type'] == 'Topology' else data['features']
+        regions = cls(features, NAME_PROPERTIES[data['type']])
+        logging.info("Loaded %d regions from %s", len(regions.names), path)
+        return regions
+
+    def _contains(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        """Index of the region containing each point, -1 if none."""
+        found = np.full(len(lon), -1)
+        bands = self._band(lat)
+        valid = np.flatnonzero((bands >= 0) & (bands < self.n_bands))
+        order = valid[np.argsort(bands[valid], kind='stable')]
+        band_bounds = np.searchsorted(bands[order], np.arange(self.n_bands + 1))
+        for band in np.flatnonzero(np.diff(band_bounds)):
+            edge_ids = self.band_edges[self.band_starts[band]:self.band_starts[band + 1]]
+            if not edge_ids.size:
+                continue
+            x1, y1, x2, y2 = self.edges[edge_ids].T
+            owner_matrix = np.zeros((len(edge_ids), len(self.names)), dtype=np.int32)
+            owner_matrix[np.arange(len(edge_ids)), self.owners[edge_ids]] = 1
+            for start in range(band_bounds[band], band_bounds[band + 1], POINT_CHUNK):
+                points = order[start:min(start + POINT_CHUNK, band_bounds[band + 1])]
+                x, y = lon[points][:, None], lat[points][:, None]
+                x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+                crossings = (((y1 > y) != (y2 > y)) & (x < x_cross)).astype(np.int32)
+                inside = (crossings @ owner_matrix) % 2 == 1
+                found[points] = np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+        return found
+
+    def _nearest_within_tolerance(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        """Region of the nearest edge within the coast tolerance, -1 if none; for points just off the polygons."""
+        nearest = np.full(len(lon), -1)
+        tolerance_bands = int(np.ceil(self.coast_tolerance_km / KM_PER_DEGREE / self.band_size))
+        bands = self._band(lat)
+        for band in np.unique(bands):
+            low, high = max(band - tolerance_bands, 0), min(band + tolerance_bands, self.n_bands - 1)
+            if low > high:
+                continue
+            edge_ids = np.unique(self.band_edges[self.band_starts[low]:self.band_starts[high + 1]])
+            if not edge_ids.size:
+                continue
+            points = np.flatnonzero(bands == band)
+            x, y = lon[points][:, None], lat[points][:, None]
+            # Local equirectangular projection around each point, in km
+            x_scale = KM_PER_DEGREE * np.cos(np.radians(y))
+            x1, y1, x2, y2 = self.edges[edge_ids].T
+            ax, ay = (x1 - x) * x_scale, (y1 - y) * KM_PER_DEGREE
+            dx, dy = (x2 - x1) * x_scale, (y2 - y1) * KM_PER_DEGREE
+            t = np.clip(-(ax * dx + ay * dy) / (dx ** 2 + dy ** 2), 0, 1)
+            distances = np.hypot(ax + t * dx, ay + t * dy)
+            closest = distances.argmin(axis=1)
+            within = distances[np.arange(len(points)), closest] <= self.coast_tolerance_km
+            nearest[points[within]] = self.owners[edge_ids[closest[within]]]
+        return nearest
+
+    def assign(self, latitude, longitude) -> pd.Series:
+        """Name of the region containing each point (or within the coast tolerance of it), None otherwise.
+
+        Results are cached by coordinates rounded to CACHE_DECIMALS.
+        """
+        scale = 10 ** CACHE_DECIMALS
+        lat = np.round(np.asarray(latitude, dtype=float) * scale)
+        lon = np.round(np.asarray(longitude, dtype=float) * scale)
+        located = ~(np.isnan(lat) | np.isnan(lon))
+        # One integer key per rounded coordinate pair (longitudes stay below 10^3 degrees)
+        keys, inverse = np.unique(lat[located].astype(np.int64) * (1000 * scale) + lon[located].astype(np.int64),
+                                  return_inverse=True)
+
+        regions = self.cache.reindex(keys)
+        uncached = np.flatnonzero(regions.isna().to_numpy())
+        if uncached.size:
+            key_lat, key_lon = (keys[uncached] // (1000 * scale)) / scale, (keys[uncached] % (1000 * scale)) / scale
+            found = self._contains(key_lon, key_lat)
+            outside = np.flatnonzero(found == -1)
+            found[outside] = self._nearest_within_tolerance(key_lon[outside], key_lat[outside])
+            # Points outside every region are cached as '' and returned as None
+            names = np.array(self.names + [''], dtype=object)
+            regions.iloc[uncached] = names[found]
+            self.cache = pd.concat([self.cache, regions.iloc[uncached]])
+
+        assigned = np.full(len(lat), None, dtype=object)
+        assigned[located] = regions.to_numpy()[inverse.ravel()]
+        assigned[assigned == ''] = None
+        return pd.Series(assigned, name='region')
+
+
+@lru_cache(maxsize=None)
+def load_regions(path: str = REGIONS_PATH) -> Regions:
+    """Regions of a file, loaded and indexed once per process."""
+    return Regions.load(path)
+
+def assign_regions(df: pd.DataFrame, path: str = REGIONS_PATH) -> pd.Series:
+    """Region of every listing from its coordinates."""
+    return load_regions(path).assign(df['latitude'], df['longitude']).set_axis(df.index)
@@ -0,0 +1,71 @@
+import time
+import logging
+
+import pandas as pd
+import requests
+
+from src.data_pipeline.geocoding import make_session
+
+# Configuration and Constants
+DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+# Distance Matrix accepts at most 25 destinations (and 100 elements) per request
+MAX_DESTINATIONS = 25
+
+
+def format_destination(latitude: float, longitude: float) -> str:
+    return f"{latitude},{longitude}"
+
+def request_distances(destinations: list, api_key: str, origin: str, session: requests.Session, url: str = DISTANCE_MATRIX_URL) -> dict:
+    """Ask for the route from the origin to up to MAX_DESTINATIONS destinations in one call; returns {destination: (distance, duration)}."""
+    try:
+        response = session.get(url, params={
+            "units": "metric",
+            "origins": origin,
+            "destinations": "|".join(destinations),
+            "key": api_key,
+        }, timeout=60).json()
+    except Exception as e:
+        logging.warning("Error fetching distances for %d destinations: %s", len(destinations), e)
+        return {}
+    if response.get("status") != "OK":
+        logging.warning("Distance Matrix request failed with status %s", response.get("status"))
+        return {}
+
+    results = {}
+    for destination, element in zip(destinations, response["rows"][0]["elements"]):
+        # Elements fail individually, e.g. ZERO_RESULTS for island properties without a road
+        if element.get("status") == "OK":
+            results[destination] = (element["distance"]["text"], element["duration"]["text"])
+    return results
+
+def get_distances_and_times(df: pd.DataFrame, api_key: str, origin: str, session: requests.Session = None,
+                            url: str = DISTANCE_MATRIX_URL, batch_size: int = MAX_DESTINATIONS) -> pd.DataFrame:
+    """Calculate the driving distance and time from HEL for every listing missing them, batching destinations per request."""
+    routes = df.reindex(columns=['distance', 'duration']).astype(object)
+    located = df['latitude'].notna() & df['longitude'].notna()
+    # Listings without coordinates cannot be routed
+    routes.loc[~located] = None
+    pending = located & (routes['distance'].isna() | routes['duration'].isna())
+    if not pending.any():
+        return routes
+
+    destinations = [format_destination(lat, lon) for lat, lon in zip(df.loc[pending, 'latitude'], df.loc[pending, 'longitude'])]
+    unique_destinations = list(dict.fromkeys(destinations))
+
+    own_session = session is None
+    session = session or make_session()
+    start = time.perf_counter()
+    results = {}
+    n_requests = 0
+    for batch_start in range(0, len(unique_destinations), batch_size):
+        results.update(request_distances(unique_destinations[batch_start:batch_start + batch_size], api_key, origin, session, url))
+        n_requests += 1
+    if own_session:
+        session.close()
+
+    routed = pd.DataFrame([results.get(destination, (None, None)) for destination in destinations],
+                          index=routes.index[pending], columns=['distance', 'duration'], dtype=object)
+    routes.loc[pending, ['distance', 'duration']] = routed
+    logging.info("Routed %d/%d destinations with %d Distance Matrix requests in %.1fs",
+                 len(results), len(unique_destinations), n_requests, time.perf_counter() - start)
+    return routes
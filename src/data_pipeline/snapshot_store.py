@@ -0,0 +1,143 @@
+import os
+import json
+import logging
+from glob import glob
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.data_pipeline.feeds import snapshot_timestamp
+
+# Configuration and Constants
+STORE_DIR = 'data/cabins/store'
+MANIFEST_NAME = 'manifest.json'
+PARTITION_KEY = 'snapshot_date'
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ('address', pa.string()),
+    ('url', pa.string()),
+    ('description', pa.string()),
+    ('rooms', pa.int8()),
+    ('winterized', pa.string()),
+    ('price', pa.float64()),
+    ('surface', pa.float64()),
+    ('year', pa.int16()),
+    ('original_price', pa.float64()),
+    ('latitude', pa.float64()),
+    ('longitude', pa.float64()),
+    ('distance', pa.string()),
+    ('duration', pa.string()),
+    ('distance_km', pa.float64()),
+    ('duration_min', pa.float64()),
+    ('first_posting_date', pa.date32()),
+    ('last_posting_date', pa.date32()),
+    ('route_estimated', pa.bool_()),
+    ('fingerprint', pa.string()),
+    ('property_id', pa.string()),
+    ('region', pa.string()),
+    ('nearest_hospital', pa.string()),
+    ('hospital_km', pa.float64()),
+    ('hospital_count', pa.int16()),
+    ('nearest_health_center', pa.string()),
+    ('health_center_km', pa.float64()),
+    ('health_center_count', pa.int16()),
+])
+
+
+def _manifest_path(store_dir: str) -> str:
+    return os.path.join(store_dir, MANIFEST_NAME)
+
+def read_manifest(store_dir: str = STORE_DIR) -> list:
+    """List the stored snapshots, oldest first."""
+    try:
+        with open(_manifest_path(store_dir)) as f:
+            return json.load(f)['snapshots']
+    except FileNotFoundError:
+        return []
+
+def _write_manifest(snapshots: list, store_dir: str):
+    snapshots = sorted(snapshots, key=lambda entry: entry['snapshot'])
+    with open(_manifest_path(store_dir), 'w') as f:
+        json.dump({"schema": SNAPSHOT_SCHEMA.names, "snapshots": snapshots}, f, indent=2)
+
+def to_table(df: pd.DataFrame) -> pa.Table:
+    """Conform a listings frame to the snapshot schema."""
+    df = df.reindex(columns=SNAPSHOT_SCHEMA.names)
+    for column in ['first_posting_date', 'last_posting_date']:
+        df[column] = pd.to_datetime(df[column]).dt.date
+    df['rooms'] = pd.to_numeric(df['rooms']).astype('Int8')
+    df['year'] = pd.to_numeric(df['year']).astype('Int16')
+    for column in ['hospital_count', 'health_center_count']:
+        df[column] = pd.to_numeric(df[column]).astype('Int16')
+    df['route_estimated'] = df['route_estimated'].astype('boolean').fillna(False)
+    return pa.Table.from_pandas(df, schema=SNAPSHOT_SCHEMA, preserve_index=False)
+
+def write_snapshot(df: pd.DataFrame, snapshot: str, store_dir: str = STORE_DIR) -> str:
+    """Store a processed snapshot ('%Y%m%d-%H%M%S') as its date partition and record it in the manifest."""
+    snapshot_date = datetime.strptime(snapshot, '%Y%m%d-%H%M%S').date().isoformat()
+    relative_path = f"{PARTITION_KEY}={snapshot_date}/part-0.parquet"
+    path = os.path.join(store_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = to_table(df)
+    pq.write_table(table, path, compression='zstd')
+
+    snapshots = [entry for entry in read_manifest(store_dir) if entry['snapshot_date'] != snapshot_date]
+    snapshots.append({
+        "snapshot": snapshot,
+        "snapshot_date": snapshot_date,
+        "path": relative_path,
+        "rows": table.num_rows,
+    })
+    _write_manifest(snapshots, store_dir)
+    return path
+
+def _resolve(which: str, snapshots: list) -> list:
+    """Select manifest entries for 'latest', 'all' or an as-of date ('YYYY-MM-DD')."""
+    if not snapshots:
+        return []
+    if which == 'latest':
+        return snapshots[-1:]
+    if which == 'all':
+        return snapshots
+    as_of = pd.Timestamp(which).date().isoformat()
+    eligible = [entry for entry in snapshots if entry['snapshot_date'] <= as_of]
+    return eligible[-1:]
+
+def load_snapshot(which: str = 'latest', columns: list = None, store_dir: str = STORE_DIR) -> pd.DataFrame:
+    """Load the 'latest' snapshot, the snapshot as of a date, or 'all' history (with a snapshot_date column)."""
+    entries = _resolve(which, read_manifest(store_dir))
+    if not entries:
+        empty = SNAPSHOT_SCHEMA.empty_table().to_pandas()
+        if columns is not None:
+            empty = empty[columns]
+        if which == 'all':
+            empty[PARTITION_KEY] = pd.Series(dtype='datetime64[ns]')
+        return empty
+    paths = [os.path.join(store_dir, entry['path']) for entry in entries]
+    # Reading through the schema returns nulls for columns older snapshots were written without
+    dataset = ds.dataset(paths, schema=SNAPSHOT_SCHEMA, format='parquet')
+
+    if which != 'all':
+        return dataset.to_table(columns=columns).to_pandas()
+
+    frames = []
+    for entry, fragment in zip(entries, dataset.get_fragments()):
+        frame = fragment.to_table(schema=dataset.schema, columns=columns).to_pandas()
+        frame[PARTITION_KEY] = pd.Timestamp(entry['snapshot_date'])
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+def migrate_csv_snapshots(folder: str = 'data/cabins', store_dir: str = STORE_DIR) -> int:
+    """One-off import of the weekly etuovi_data_*.csv files into the store."""
+    paths = sorted(glob(os.path.join(folder, 'etuovi_data_*.csv')), key=snapshot_timestamp)
+    for path in paths:
+        write_snapshot(pd.read_csv(path), snapshot_timestamp(path), store_dir)
+        logging.info("Migrated %s", path)
+    return len(paths)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    migrate_csv_snapshots()
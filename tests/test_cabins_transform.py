@@ -0,0 +1,43 @@
+import os
+import shutil
+
+import pytest
+
+from src.data_pipeline import cabins_transform
+from src.data_pipeline.backfill import backfill
+from src.data_pipeline.feeds import find_snapshots
+from src.data_pipeline.geocode_cache import GeocodeCache
+from src.data_pipeline.price_events import load_price_events
+from src.data_pipeline.snapshot_store import load_snapshot
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def repo_copy(tmp_path, monkeypatch):
+    """The repository's data in a scratch directory, its store rebuilt from the feeds, with every external API stubbed out."""
+    shutil.copytree(os.path.join(REPO_ROOT, 'data'), tmp_path / 'data', ignore=shutil.ignore_patterns('cache', 'store'))
+    monkeypatch.chdir(tmp_path)
+    backfill(workers=1)
+    monkeypatch.setattr(cabins_transform, 'load_environment_variables',
+                        lambda: {"google_key": "key", "openrouteservice_key": "key", "origin": "HEL"})
+    monkeypatch.setattr(cabins_transform, 'GeocodeCache', lambda: GeocodeCache(str(tmp_path / 'geocode.sqlite')))
+    monkeypatch.setattr(cabins_transform.GeocodingEngine, 'geocode_many',
+                        lambda self, addresses: {address: (None, None) for address in addresses})
+    monkeypatch.setattr(cabins_transform, 'get_distances_and_times', lambda df, *args: df[['distance', 'duration']])
+    monkeypatch.setattr(cabins_transform, 'estimate_missing_routes',
+                        lambda df: df[['distance', 'duration', 'route_estimated']])
+    return tmp_path
+
+
+def test_rerun_keeps_the_price_events_of_the_snapshot(repo_copy):
+    # The latest crawl is already in the store: transforming it again diffs it against itself
+    snapshot_date = load_snapshot('latest')['last_posting_date'].max()
+    assert find_snapshots()[0].startswith(snapshot_date.strftime('%Y%m%d'))
+    recorded = load_price_events(since=snapshot_date)
+    assert len(recorded)
+
+    cabins_transform.transform_data()
+    cabins_transform.transform_data()
+
+    assert load_price_events(since=snapshot_date).equals(recorded)
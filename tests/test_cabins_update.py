@@ -0,0 +1,53 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from src.data_pipeline.cabins_update import LOAD_COLUMNS, SQLiteBackend, load_delta
+
+
+def snapshot(posting_date: str, prices: dict) -> pd.DataFrame:
+    """cabins_main rows for the given {url: price}, all last posted on posting_date."""
+    df = pd.DataFrame({"url": list(prices), "price": list(prices.values())}).reindex(columns=LOAD_COLUMNS)
+    df['address'] = df['url'].str.upper()
+    df['first_posting_date'] = datetime.date(2024, 8, 5)
+    df['last_posting_date'] = datetime.date.fromisoformat(posting_date)
+    return df
+
+@pytest.fixture
+def backend():
+    backend = SQLiteBackend()
+    yield backend
+    backend.close()
+
+def stored(backend) -> pd.DataFrame:
+    return backend.read_table('cabins_main').set_index('url').sort_index()
+
+
+def test_first_load_inserts_every_row(backend):
+    counts = load_delta(snapshot('2024-08-05', {"a": 100_000, "b": 200_000}), backend)
+
+    assert (counts['inserted'], counts['updated'], counts['unchanged']) == (2, 0, 0)
+    assert stored(backend)['price'].tolist() == [100_000, 200_000]
+
+def test_changed_content_is_updated(backend):
+    load_delta(snapshot('2024-08-05', {"a": 100_000, "b": 200_000}), backend)
+    counts = load_delta(snapshot('2024-08-12', {"a": 95_000, "b": 200_000, "c": 50_000}), backend)
+
+    assert (counts['inserted'], counts['updated'], counts['unchanged'], counts['reposted']) == (1, 1, 1, 1)
+    rows = stored(backend)
+    assert rows['price'].tolist() == [95_000, 200_000, 50_000]
+    assert (rows['last_posting_date'] == '2024-08-12').all()
+
+def test_repost_only_moves_last_posting_date(backend):
+    load_delta(snapshot('2024-08-05', {"a": 100_000, "b": 200_000}), backend)
+    counts = load_delta(snapshot('2024-08-12', {"a": 100_000, "b": 200_000}), backend)
+
+    assert (counts['inserted'], counts['updated'], counts['unchanged'], counts['reposted']) == (0, 0, 2, 2)
+    assert (stored(backend)['last_posting_date'] == '2024-08-12').all()
+
+def test_reload_changes_nothing(backend):
+    load_delta(snapshot('2024-08-05', {"a": 100_000}), backend)
+    counts = load_delta(snapshot('2024-08-05', {"a": 100_000}), backend)
+
+    assert (counts['inserted'], counts['updated'], counts['unchanged'], counts['reposted']) == (0, 0, 1, 0)
@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+import requests
+
+from scripts.mock_api_server import mock_distance_matrix_url, start_mock_server
+from src.data_pipeline.routing import MAX_DESTINATIONS, get_distances_and_times
+
+
+class CountingSession(requests.Session):
+    """Session recording the destinations of every Distance Matrix request."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def get(self, url, params=None, **kwargs):
+        self.batches.append(params["destinations"].split("|"))
+        return super().get(url, params=params, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def distance_matrix_url():
+    server, base_url = start_mock_server(latency=0)
+    yield mock_distance_matrix_url(base_url)
+    server.shutdown()
+
+def listings(n: int) -> pd.DataFrame:
+    # Distinct destinations between latitudes 60 and 65, all reachable by road on the mock server
+    return pd.DataFrame({"latitude": [60 + i / 20 for i in range(n)], "longitude": [25.0] * n,
+                         "distance": None, "duration": None})
+
+
+def test_destinations_are_batched(distance_matrix_url):
+    session = CountingSession()
+    routes = get_distances_and_times(listings(60), "key", "HEL", session=session, url=distance_matrix_url)
+
+    assert [len(batch) for batch in session.batches] == [MAX_DESTINATIONS, MAX_DESTINATIONS, 10]
+    assert routes['distance'].notna().all() and routes['duration'].notna().all()
+
+def test_duplicate_destinations_are_requested_once(distance_matrix_url):
+    session = CountingSession()
+    df = pd.concat([listings(3)] * 2, ignore_index=True)
+    routes = get_distances_and_times(df, "key", "HEL", session=session, url=distance_matrix_url)
+
+    assert [len(batch) for batch in session.batches] == [3]
+    assert routes.iloc[:3].to_numpy().tolist() == routes.iloc[3:].to_numpy().tolist()
+
+def test_zero_results_element_gives_no_route(distance_matrix_url):
+    # The mock server answers ZERO_RESULTS north of latitude 69, next to routed destinations in the same batch
+    df = pd.DataFrame({"latitude": [61.0, 69.5, 62.0], "longitude": [25.0, 27.0, 25.0],
+                       "distance": None, "duration": None})
+    routes = get_distances_and_times(df, "key", "HEL", session=CountingSession(), url=distance_matrix_url)
+
+    assert routes.loc[1].tolist() == [None, None]
+    assert routes.loc[[0, 2]].notna().all().all()
+
+def test_known_and_unlocated_listings_are_not_requested(distance_matrix_url):
+    session = CountingSession()
+    df = pd.DataFrame({"latitude": [61.0, None], "longitude": [25.0, None],
+                       "distance": ["100 km", "50 km"], "duration": ["1 hour 15 mins", "40 mins"]})
+    routes = get_distances_and_times(df, "key", "HEL", session=session, url=distance_matrix_url)
+
+    assert session.batches == []
+    assert routes.loc[0].tolist() == ["100 km", "1 hour 15 mins"]
+    assert routes.loc[1].tolist() == [None, None]